@@ -0,0 +1,143 @@
+"""
+Bookkeeping and removal of the files produced by the toolchain.
+
+Every command records in a manifest the top level entries matching its
+artifact patterns that it created or changed, compared with a snapshot
+taken before it ran. Entries that only happen to match a pattern are left
+alone, so that clean removes exactly what the toolchain produced.
+"""
+
+import fnmatch
+import os
+
+MANIFEST = ".artifacts"
+WORKERS = 8
+
+
+def find(project_path, patterns):
+    """
+    :param patterns: shell style patterns of top level project entries
+    :type patterns: list
+    :return: names of the top level project entries matching the patterns
+    :rtype: list
+    """
+    with os.scandir(project_path) as entries:
+        return sorted(
+            entry.name for entry in entries
+            if any(fnmatch.fnmatch(entry.name, it) for it in patterns)
+        )
+
+
+def _signature(path):
+    # Changes anywhere in a tree change the state of one of its entries or
+    # the set of the entries
+    states = []
+    for fil in [path] + [
+        os.path.join(root, name)
+        for root, dirs, files in os.walk(path) for name in dirs + files
+    ]:
+        info = os.lstat(fil)
+        states.append((
+            os.path.relpath(fil, path), info.st_mtime_ns, info.st_size,
+            info.st_ino
+        ))
+    return hash(tuple(sorted(states)))
+
+
+def snapshot(project_path, patterns):
+    """
+    :return: states of the top level project entries matching the patterns
+    :rtype: dict
+    """
+    return {
+        name: _signature(os.path.join(project_path, name))
+        for name in find(project_path, patterns)
+    }
+
+
+def produced(before, after):
+    """
+    :param before: snapshot taken before a command ran
+    :param after: snapshot taken after it
+    :return: names of the entries the command created or changed
+    :rtype: list
+    """
+    return sorted(
+        name for name, state in after.items() if before.get(name) != state
+    )
+
+
+def exists(project_path):
+    """
+    :return: True if the project has a manifest
+    :rtype: bool
+    """
+    return os.path.exists(os.path.join(project_path, MANIFEST))
+
+
+def load(project_path):
+    """
+    :return: artifact names listed in the manifest
+    :rtype: list
+    """
+    path = os.path.join(project_path, MANIFEST)
+    if not os.path.exists(path):
+        return []
+    with open(path) as fil:
+        return [line for line in fil.read().splitlines() if line]
+
+
+def record(project_path, names):
+    """Adds the artifact names to the manifest."""
+    merged = sorted(set(load(project_path)) | set(names))
+    with open(os.path.join(project_path, MANIFEST), "w") as fil:
+        fil.write("".join(name + "\n" for name in merged))
+
+
+def _ignore_missing(function, path):
+    try:
+        function(path)
+    except FileNotFoundError:
+        pass
+
+
+def _rm_entry(entry):
+    if entry.is_dir(follow_symlinks=False):
+        _rm_tree(entry.path)
+    else:
+        _ignore_missing(os.unlink, entry.path)
+
+
+def _rm_tree(path):
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                _rm_entry(entry)
+    except FileNotFoundError:
+        return
+    _ignore_missing(os.rmdir, path)
+
+
+def remove_all(paths):
+    """
+    Removes files and directory trees. Top level entries of the directories
+    are removed in parallel.
+    """
+    # Imported here to keep the startup of other commands fast
+    from concurrent.futures import ThreadPoolExecutor
+    dirs = []
+    with ThreadPoolExecutor(WORKERS) as pool:
+        futures = []
+        for path in paths:
+            if os.path.isdir(path) and not os.path.islink(path):
+                dirs.append(path)
+                with os.scandir(path) as entries:
+                    futures.extend(
+                        pool.submit(_rm_entry, entry) for entry in entries
+                    )
+            elif os.path.lexists(path):
+                futures.append(pool.submit(_ignore_missing, os.unlink, path))
+    for future in futures:
+        future.result()
+    for path in dirs:
+        _ignore_missing(os.rmdir, path)
@@ -0,0 +1,236 @@
+"""
+Runs the doctests of all the modules of the given packages with coverage.
+
+Results of the modules that pass are cached by the hash of the module
+source, so the modules that did not change since the last run are neither
+imported nor executed again. Like ``pytest --doctest-modules`` the doctests
+use the ``doctest_optionflags`` of the pytest configuration, ELLIPSIS if
+there are none. Covered lines of all the modules, cached ones
+included, are stored in a coverage data file to be combined with the one
+of the unit tests.
+
+Usage::
+
+    python -m docker_ci_python.doctests --cache=FILE --data-file=FILE PKG...
+"""
+
+from __future__ import print_function
+
+import argparse
+import configparser
+import doctest
+import hashlib
+import importlib
+import json
+import os
+import sys
+import traceback
+
+
+def _modules(package):
+    for root, dirs, files in os.walk(package):
+        dirs[:] = sorted(
+            name for name in dirs
+            if os.path.exists(os.path.join(root, name, "__init__.py"))
+        )
+        for name in sorted(files):
+            if not name.endswith(".py"):
+                continue
+            path = os.path.join(root, name)
+            module = os.path.splitext(path)[0].replace(os.sep, ".")
+            if module.endswith(".__init__"):
+                module = module[:-len(".__init__")]
+            yield module, path
+
+
+def _hash(path):
+    with open(path, "rb") as fil:
+        return hashlib.sha256(fil.read()).hexdigest()
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fil:
+        try:
+            return json.load(fil)
+        except ValueError:
+            return {}
+
+
+def _save(path, cache):
+    with open(path, "w") as fil:
+        json.dump(cache, fil, indent=1, sort_keys=True)
+
+
+# Files pytest takes its configuration from, in the order it looks for them
+_INI_FILES = [
+    ("pytest.ini", "pytest"),
+    ("tox.ini", "pytest"),
+    ("setup.cfg", "tool:pytest"),
+]
+
+
+def _ini_flags(directory):
+    for name, section in _INI_FILES:
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path):
+            continue
+        config = configparser.ConfigParser(interpolation=None)
+        config.read(path)
+        if name == "pytest.ini" or config.has_section(section):
+            return config.get(
+                section, "doctest_optionflags", fallback="ELLIPSIS"
+            ).split()
+    return None
+
+
+def option_flags(directory):
+    """
+    :return: doctest option flags of the pytest configuration found in
+             the directory or above it
+    :rtype: int
+    """
+    directory = os.path.abspath(directory)
+    while True:
+        names = _ini_flags(directory)
+        parent = os.path.dirname(directory)
+        if names is not None or parent == directory:
+            break
+        directory = parent
+    flags = 0
+    for name in names or ["ELLIPSIS"]:
+        if name in doctest.OPTIONFLAGS_BY_NAME:
+            flags |= doctest.OPTIONFLAGS_BY_NAME[name]
+        else:  # e.g. NUMBER, which only pytest supports
+            print("Unsupported doctest option flag {}".format(name))
+    return flags
+
+
+def _forget(packages):
+    # Project modules are imported again by every run so that their
+    # module level code is measured as well
+    for name in list(sys.modules):
+        if name.split(".")[0] in packages:
+            del sys.modules[name]
+
+
+def run_doctests(name, runner):
+    """
+    Imports the module and runs its doctests.
+
+    :return: False if the module could not be imported
+    :rtype: bool
+    """
+    try:
+        module = importlib.import_module(name)
+        for test in doctest.DocTestFinder().find(module):
+            runner.run(test)
+    # Import errors of any kind are doctest failures of the module
+    except Exception:  # pylint: disable=broad-except
+        traceback.print_exc()
+        return False
+    return True
+
+
+def run_module(name, path, packages, optionflags=0):
+    """
+    Imports the module and runs its doctests while measuring coverage of its
+    source file.
+
+    :return: number of failures, number of examples and covered lines
+             per file
+    :rtype: tuple
+    """
+    import coverage
+    _forget(packages)
+    cov = coverage.Coverage(data_file=None, source=packages)
+    runner = doctest.DocTestRunner(optionflags=optionflags)
+    # Kept minimal since a coverage run a test suite measures this module
+    # with is paused for the time
+    cov.start()
+    try:
+        imported = run_doctests(name, runner)
+    finally:
+        cov.stop()
+    if not imported:
+        return 1, runner.tries, {}
+    # Lines of other files depend on their sources, which are not
+    # a part of the cache key
+    fil = os.path.realpath(path)
+    return runner.failures, runner.tries, {
+        fil: sorted(cov.get_data().lines(fil) or [])
+    }
+
+
+def _merge(lines, other):
+    for fil, numbers in other.items():
+        lines[fil] = sorted(set(lines.get(fil, [])) | set(numbers))
+
+
+def write_coverage(path, lines):
+    """Stores covered lines in a coverage data file."""
+    import coverage
+    if os.path.exists(path):
+        os.remove(path)
+    cov = coverage.Coverage(data_file=path)
+    cov.get_data().add_lines(lines)
+    cov.save()
+
+
+def run(packages, cache_path, data_file):
+    """
+    :return: number of failed doctests
+    :rtype: int
+    """
+    sys.path.insert(0, os.getcwd())
+    flags = option_flags(os.getcwd())
+    cache = _load(cache_path)
+    result = {}
+    lines = {}
+    failed = cached = examples = 0
+    for package in packages:
+        for name, path in _modules(package):
+            digest = _hash(path)
+            entry = cache.get(name)
+            if entry and entry["hash"] == digest and \
+                    entry.get("flags") == flags:
+                cached += 1
+            else:
+                failures, tries, measured = run_module(
+                    name, path, packages, flags
+                )
+                if failures:
+                    failed += failures
+                    continue
+                entry = {
+                    "hash": digest,
+                    "flags": flags,
+                    "tries": tries,
+                    "lines": measured
+                }
+            result[name] = entry
+            examples += entry["tries"]
+            _merge(lines, entry["lines"])
+    _save(cache_path, result)
+    write_coverage(data_file, lines)
+    print(
+        "Doctests: {} examples passed in {} modules ({} cached), "
+        "{} failed".format(examples, len(result), cached, failed)
+    )
+    return failed
+
+
+def main(argv=None):
+    # pylint: disable=missing-docstring
+    parser = argparse.ArgumentParser("Run cached doctests with coverage")
+    parser.add_argument("--cache", required=True)
+    parser.add_argument("--data-file", required=True)
+    parser.add_argument("packages", nargs="*")
+    args = parser.parse_args(argv)
+    if run(args.packages, args.cache, args.data_file):
+        sys.exit(1)
+
+
+if __name__ == "__main__":  # pragma: nocover
+    main()
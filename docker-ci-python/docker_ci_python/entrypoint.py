@@ -4,10 +4,12 @@ import os
 import shutil
 import subprocess
 import sys
+import threading
+import time
 
-import setuptools
-
+from . import artifacts, perf_history, resources
 from .run_command import run_command, CommandException
+from .wheel_cache import WheelCache, source_digest
 
 
 def _exists(*args):
@@ -18,13 +20,6 @@ def _wrap(strings, fmt):
     return list(map(fmt.format, strings))
 
 
-def _rm(*args):
-    path = os.path.join(*args)
-    shutil.rmtree(path, ignore_errors=True)
-    if os.path.exists(path):
-        os.remove(path)
-
-
 def _run_with_safe_error(cmd, safe_error):
     try:
         run_command(cmd, silent=True, capture=True)
@@ -34,6 +29,10 @@ def _run_with_safe_error(cmd, safe_error):
             raise error
 
 
+# Commands may be run for the project from several threads at once
+_USER_LOCK = threading.Lock()
+
+
 def _run_for_project(project_path, command):
     if not os.path.exists(project_path):
         sys.exit("'{}' directory does not exist".format(project_path))
@@ -45,38 +44,124 @@ def _run_for_project(project_path, command):
     if uid == 0:  # mounted on behalf of root user (Mac)
         return run_command(command, capture=True)
     else:  # mounted on behalf of host user (Linux)
-        _run_with_safe_error(
-            ["addgroup", "-g", str(gid), "tester"],
-            "addgroup: group 'tester' in use"
-        )
-        _run_with_safe_error(
-            ["adduser", "-D", "-u",
-             str(uid), "-G", "tester", "tester"],
-            "adduser: user 'tester' in use"
-        )
+        with _USER_LOCK:
+            _run_with_safe_error(
+                ["addgroup", "-g", str(gid), "tester"],
+                "addgroup: group 'tester' in use"
+            )
+            _run_with_safe_error(
+                ["adduser", "-D", "-u",
+                 str(uid), "-G", "tester", "tester"],
+                "adduser: user 'tester' in use"
+            )
         try:
             return run_command(["sudo", "-E", "-S", "-u", "tester"] + command,
                                capture=True)
         except CommandException as error:
-            raise CommandException(error.returncode, command, error.output)
+            raise CommandException(
+                error.returncode, command, error.output, usage=error.usage
+            )
+
+
+def _give_to_project_owner(project_path, paths):
+    # Files the entry point writes itself rather than through
+    # _run_for_project must be owned by the host user just as well
+    stat_info = os.stat(project_path)
+    if stat_info.st_uid == 0:  # mounted on behalf of root user (Mac)
+        return
+    for path in paths:
+        if not os.path.lexists(path):
+            continue
+        found = [path]
+        if os.path.isdir(path) and not os.path.islink(path):
+            for root, dirs, files in os.walk(path):
+                found += [os.path.join(root, name) for name in dirs + files]
+        for fil in found:
+            os.chown(
+                fil, stat_info.st_uid, stat_info.st_gid, follow_symlinks=False
+            )
+
+
+def _bookkeeping(title, function, *args):
+    # Failing to keep the records must not change the outcome of a command
+    # nor hide its error
+    try:
+        return function(*args)
+    except Exception as error:  # pylint: disable=broad-except
+        print("Could not {}: {}".format(title, error), file=sys.stderr)
+        return None
 
 
 def _format_help_string(help_string):
     return " ".join(help_string.replace("\n", "").split())
 
 
+def _produces(*patterns):
+    # Declares top level project entries a command may leave behind
+
+    def _decorate(command):
+        command.artifacts = patterns
+        return command
+
+    return _decorate
+
+
+def _with_command_table(cls):
+    # Precompute the list of subcommands once instead of inspecting
+    # the class on every invocation
+    commands = [
+        (name, field) for name, field in sorted(vars(cls).items())
+        if not name.startswith("_") and callable(field)
+    ]
+    cls.COMMANDS = tuple(
+        (name.replace("_", "-"), _format_help_string(field.__doc__))
+        for name, field in commands
+    )
+    cls.ARTIFACTS = sorted({
+        pattern
+        for _, field in commands
+        for pattern in getattr(field, "artifacts", ())
+    })
+    return cls
+
+
 DOCS = "gen-docs"
+PROFILE_COLLAPSED = "profile.collapsed"
+PROFILE_REPORT = "profile.txt"
+WHEEL_CACHE = ".wheel-cache"
+UNIT_COVERAGE = ".coverage.unit"
+DOCTEST_COVERAGE = ".coverage.doctest"
+DOCTEST_CACHE = ".doctest-cache.json"
+# Number of previous runs the latest one is compared against and
+# the minimal number of them to detect a regression
+PERF_WINDOW = 10
+PERF_MIN_RUNS = 3
+# Files besides the package sources that end up in a wheel
+BUILD_INPUTS = ["setup.yml", "CHANGES", "README.rst", "MANIFEST.in"]
+
+
+def _wheels(path):
+    if not os.path.isdir(path):
+        return {}
+    return {
+        name: os.path.getmtime(os.path.join(path, name))
+        for name in os.listdir(path) if name.endswith(".whl")
+    }
 
 
 class ModuleUtils(object):
     # pylint: disable=missing-docstring
 
-    def __init__(self, project_path, config_path):
+    def __init__(self, project_path, config_path, timer=None):
         self._project_path = project_path
         self._config_path = config_path
+        self._timer = timer or perf_history.StageTimer()
 
     def _run(self, args):
-        return _run_for_project(self._project_path, args)
+        return self._timer.run(
+            perf_history.stage_name(args), _run_for_project,
+            self._project_path, args
+        )
 
     # pylint: disable=missing-docstring
     def reformat_pkg(self, module_name):
@@ -106,8 +191,11 @@ class ModuleUtils(object):
 
     # pylint: disable=missing-docstring
     def get_testable_packages(self):
+        # setuptools takes a few hundred milliseconds to import, it must not
+        # slow down the commands that never look for packages
+        from setuptools import find_packages
         return [
-            pkg for pkg in setuptools.find_packages(
+            pkg for pkg in find_packages(
                 self._project_path, exclude=["tests", 'integration_tests']
             ) if "." not in pkg
         ]
@@ -135,6 +223,7 @@ class ModuleUtils(object):
             )
 
 
+@_with_command_table
 class EntryPoint(object):
     """
     Docker entry point to run various commands for a Python project
@@ -144,39 +233,87 @@ class EntryPoint(object):
     # All methods here should remain members of the EntryPoint class
     # pylint: disable=no-self-use
 
-    ARTIFACTS = [
-        "coverage", ".coverage", "coverage.xml", "pytest.ini"
-        "test-results.xml", DOCS, "dist", "build"
-    ]
-
     def __init__(self, project_path, config_path):
         self._project_path = project_path
         self._config_path = config_path
-        self._package_utils = ModuleUtils(project_path, config_path)
+        self._timer = perf_history.StageTimer()
+        self._package_utils = ModuleUtils(
+            project_path, config_path, self._timer
+        )
+        self._packages = None
 
     def __call__(self, command):
         runnable = getattr(self, command.replace("-", "_"))
-        runnable()
+        patterns = getattr(runnable, "artifacts", ())
+        before = patterns and _bookkeeping(
+            "snapshot the artifacts", artifacts.snapshot, self._project_path,
+            patterns
+        )
+        started = time.time()
+        succeeded = False
+        try:
+            runnable()
+            succeeded = True
+        finally:
+            if patterns and before is not None:
+                _bookkeeping(
+                    "record the artifacts", self._record_artifacts, patterns,
+                    before
+                )
+            # Commands that do not spawn any tools are not worth tracking
+            if self._timer.stages:
+                _bookkeeping(
+                    "record the performance", self._record_performance,
+                    command, started, succeeded
+                )
+
+    def _record_artifacts(self, patterns, before):
+        artifacts.record(
+            self._project_path,
+            artifacts.produced(
+                before, artifacts.snapshot(self._project_path, patterns)
+            )
+        )
+        _give_to_project_owner(
+            self._project_path,
+            [os.path.join(self._project_path, artifacts.MANIFEST)]
+        )
+
+    def _record_performance(self, command, started, succeeded):
+        database = os.path.join(self._project_path, perf_history.DATABASE)
+        perf_history.record(
+            database, command, started, succeeded,
+            perf_history.project_counts(self._project_path, self._modules),
+            self._timer.stages
+        )
+        _give_to_project_owner(self._project_path, [database])
+        for line in perf_history.summary_lines(
+                self._timer.stages, resources.cgroup_counters()):
+            print(line)
 
     def _get_commands(self):
-        for field_name in dir(self):
-            if field_name.startswith("_"):
-                continue
-            field = getattr(self, field_name)
-            if callable(field):
-                yield (
-                    field_name.replace("_", "-"),
-                    _format_help_string(field.__doc__)
-                )
+        return self.COMMANDS
 
     def _run(self, args):
-        return _run_for_project(
-            self._project_path, list(filter(lambda it: it, args))
+        args = list(filter(lambda it: it, args))
+        return self._timer.run(
+            perf_history.stage_name(args), _run_for_project,
+            self._project_path, args
         )
 
     @property
     def _modules(self):
-        return self._package_utils.get_testable_packages()
+        if self._packages is None:
+            self._packages = self._package_utils.get_testable_packages()
+        return self._packages
+
+    @property
+    def _wheel_cache(self):
+        max_size = int(os.environ.get("WHEEL_CACHE_MAX_SIZE", "512"))
+        return WheelCache(
+            os.path.join(self._project_path, WHEEL_CACHE),
+            max_size * 1024 * 1024
+        )
 
     # We do want it to be called help
     # pylint: disable=redefined-builtin
@@ -206,42 +343,185 @@ class EntryPoint(object):
         for pkg_name, pylint_rc in pkg_configs + test_configs:
             self._package_utils.static_check(pkg_name, pylint_rc)
 
+    def perf_history(self):
+        """
+        Shows wall time trends of every stage and fails if a stage got slower
+        than its baseline by more than PERF_THRESHOLD (0.2 by default), only
+        warns if PERF_WARN_ONLY=1
+        """
+        threshold = float(os.environ.get("PERF_THRESHOLD", "0.2"))
+        stage_trends = perf_history.trends(
+            os.path.join(self._project_path, perf_history.DATABASE),
+            window=PERF_WINDOW
+        )
+        row = "{:<40} {:>5} {:>9} {:>9} {:>8} {:>9}"
+        print(row.format("stage", "runs", "latest", "baseline", "change",
+                         "cpu"))
+        for command, name, runs, latest, baseline, cpu in stage_trends:
+            print(row.format(
+                "{}/{}".format(command, name), runs, "{:.2f}s".format(latest),
+                "-" if baseline is None else "{:.2f}s".format(baseline),
+                "-" if not baseline else "{:+.0%}".format(
+                    latest / baseline - 1
+                ), "{:.2f}s".format(cpu)
+            ))
+        slower = perf_history.regressions(
+            stage_trends, threshold, min_runs=PERF_MIN_RUNS
+        )
+        if not slower:
+            return
+        message = "Stages slower than their baseline by more than " \
+            "{:.0%}: {}".format(threshold, ", ".join(
+                "{}/{}".format(trend[0], trend[1]) for trend in slower
+            ))
+        if os.environ.get("PERF_WARN_ONLY") == "1":
+            print(message)
+        else:
+            sys.exit(message)
+
+    def _pytest_args(self, modules):
+        # Coverage is reported once the data of doctests is merged in
+        return [
+            "pytest",
+            "--cov-report=",
+            "--junit-xml=test-results.xml",
+        ] + _wrap(modules, "--cov={}")
+
+    def _run_stages(self, *stages):
+        # Imported here to keep the startup of other commands fast
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(len(stages)) as pool:
+            futures = [pool.submit(self._run, stage) for stage in stages]
+        for future in futures:
+            future.result()
+
+    @_produces(
+        "coverage", ".coverage", "coverage.xml", "test-results.xml",
+        UNIT_COVERAGE, DOCTEST_COVERAGE, DOCTEST_CACHE
+    )
     def tests(self):
-        """Runs unit tests with code coverage"""
+        """
+        Runs unit tests and cached doctests in parallel with combined code
+        coverage
+        """
+        modules = self._modules
+        self._run_stages(
+            ["env", "COVERAGE_FILE={}".format(UNIT_COVERAGE)] +
+            self._pytest_args(modules),
+            [
+                "python", "-m", "docker_ci_python.doctests",
+                "--cache={}".format(DOCTEST_CACHE),
+                "--data-file={}".format(DOCTEST_COVERAGE)
+            ] + modules,
+        )
+        self._run(["coverage", "combine", UNIT_COVERAGE, DOCTEST_COVERAGE])
+        self._run(["coverage", "html", "--directory=coverage"])
+        self._run(["coverage", "xml", "-o", "coverage.xml"])
         # There is no way to make coverage module show missed lines otherwise
+        self._run([
+            "coverage", "report", "--show-missing", "--skip-covered",
+            "--fail-under=100"
+        ])
+
+    def quick_tests(self):
+        """
+        Runs previously failed tests and tests of recently changed modules
+        first and reports the time to the first failure, stops at the first
+        failure if FAIL_FAST=1
+        """
+        fail_fast = os.environ.get("FAIL_FAST") == "1"
         self._run([
             "pytest",
-            "--cov-report=term-missing:skip-covered",
-            "--cov-report=html:coverage",
-            "--cov-report=xml:coverage.xml",
-            "--doctest-modules",
-            "--cov-fail-under=100",
-            "--junit-xml=test-results.xml",
-        ] + _wrap(self._modules, "--cov={}"))
+            "-p",
+            "docker_ci_python.ordering",
+            "--exitfirst" if fail_fast else None,
+        ])
 
-    def _eggs(self):
-        return list(
-            filter(lambda fil: fil.endswith(".egg-info"), os.listdir("."))
-        )
+    @_produces(PROFILE_COLLAPSED, PROFILE_REPORT)
+    def profile_tests(self):
+        """
+        Runs unit tests under a sampling profiler and stores per test
+        hotspots in profile.txt and flame graph stacks in profile.collapsed
+        """
+        # No coverage tracing, which would distort every hotspot, and no
+        # reports that would overwrite the ones of the tests command
+        self._run([
+            "pytest", "-p", "docker_ci_python.profiling",
+            "--profile-collapsed={}".format(PROFILE_COLLAPSED),
+            "--profile-report={}".format(PROFILE_REPORT),
+        ])
 
     def clean(self):
         """Removes all the artifacts produced by the toolchain"""
-        for artifact in self.ARTIFACTS + self._eggs():
-            _rm(self._project_path, artifact)
+        if artifacts.exists(self._project_path):
+            names = artifacts.load(self._project_path)
+        else:  # produced before the manifest existed, only patterns help
+            names = artifacts.find(self._project_path, self.ARTIFACTS)
+        artifacts.remove_all([
+            os.path.join(self._project_path, name)
+            for name in names + [artifacts.MANIFEST]
+        ])
 
     def reformat(self):
         """Reformats the code to have the best possible style"""
         for pkg_name in ["tests", "integration_tests"] + self._modules:
             self._package_utils.reformat_pkg(pkg_name)
 
+    @_produces("dist", "build", "*.egg-info")
     def build(self):
-        """Produces a library package in the form of wheel package"""
-        self._run([
-            "python",
-            os.path.join(self._config_path, "setup.py"),
-            "bdist_wheel",
-        ])
+        """
+        Produces a library package in the form of wheel package or reuses
+        the one built from exactly the same sources
+        """
+        setup_py = os.path.join(self._config_path, "setup.py")
+        digest = source_digest(
+            self._project_path, [setup_py] + [
+                os.path.join(self._project_path, path)
+                for path in self._modules + BUILD_INPUTS
+            ]
+        )
+        dist = os.path.join(self._project_path, "dist")
+        cache = self._wheel_cache
+        cached = cache.get(digest)
+        if cached:
+            os.makedirs(dist, exist_ok=True)
+            for wheel in cached:
+                print("Reusing cached {}".format(os.path.basename(wheel)))
+                shutil.copy2(wheel, dist)
+            # Otherwise the next bdist_wheel can not write into dist
+            _give_to_project_owner(self._project_path, [dist])
+            return
+        before = _wheels(dist)
+        self._run(["python", setup_py, "bdist_wheel"])
+        built = [
+            os.path.join(dist, name)
+            for name, mtime in _wheels(dist).items()
+            if before.get(name) != mtime
+        ]
+        if built:
+            cache.put(digest, built)
+            cache.evict()
+            _give_to_project_owner(
+                self._project_path,
+                [os.path.join(self._project_path, WHEEL_CACHE)]
+            )
+
+    def wheel_cache(self):
+        """Lists the wheels stored in the build cache"""
+        for digest, size, used, names in self._wheel_cache.entries():
+            print("{} {:>10} {}".format(
+                digest[:12], size, time.strftime(
+                    "%Y-%m-%d %H:%M:%S", time.localtime(used)
+                )
+            ))
+            for name in names:
+                print("\t{}".format(name))
+
+    def prune_wheel_cache(self):
+        """Removes all the wheels from the build cache"""
+        self._wheel_cache.clear()
 
+    @_produces(DOCS)
     def build_docs(self):
         """Produces api docs in the form of .rst and .html files"""
         for module in self._modules:
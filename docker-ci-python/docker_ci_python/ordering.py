@@ -0,0 +1,157 @@
+"""
+Pytest plugin that runs the tests most likely to fail first.
+
+Load it with ``-p docker_ci_python.ordering``. Tests are run in this order:
+
+1. the tests that failed in the previous run;
+2. the tests whose module is, or refers to, a module that changed since
+   the previous run;
+3. the rest of the tests in the collection order.
+
+The time it took to see the first failure is shown in the summary and
+stored in the pytest cache.
+
+Modules count as changed until a run executes all the tests, so the ones
+whose tests were skipped by ``--exitfirst``, ``-k`` or an interruption
+are still run first the next time.
+"""
+
+import os
+import sys
+import time
+import types
+
+import pytest
+
+LAST_FAILED = "cache/lastfailed"
+MTIMES = "docker_ci_python/mtimes"
+TIME_TO_FIRST_FAILURE = "docker_ci_python/time_to_first_failure"
+# Exit statuses of a session that ran to its end, pytest.ExitCode
+# appeared only in pytest 5
+_COMPLETED = (0, 1)
+
+
+def source_mtimes(root):
+    """
+    :return: modification times of the python files of the project
+    :rtype: dict
+    """
+    mtimes = {}
+    for path, dirs, files in os.walk(root):
+        dirs[:] = [name for name in dirs if not name.startswith(".")]
+        for name in files:
+            if name.endswith(".py"):
+                fil = os.path.join(path, name)
+                mtimes[os.path.realpath(fil)] = os.path.getmtime(fil)
+    return mtimes
+
+
+def changed_modules(previous, current):
+    """
+    :return: names of the imported modules whose files are new or were
+             modified
+    :rtype: set
+    """
+    changed = {
+        fil for fil, mtime in current.items() if previous.get(fil) != mtime
+    }
+    return {
+        name for name, module in list(sys.modules.items())
+        if os.path.realpath(getattr(module, "__file__", None) or "") in changed
+    }
+
+
+def _module_name(value):
+    if isinstance(value, types.ModuleType):
+        return value.__name__
+    return getattr(value, "__module__", None)
+
+
+def refers_to(item, modules):
+    """
+    :return: True if the test is defined in, or its module refers to
+             anything from, one of the modules
+    :rtype: bool
+    """
+    module = getattr(item, "module", None)
+    if module is None:
+        return False
+    return module.__name__ in modules or any(
+        _module_name(value) in modules for value in vars(module).values()
+    )
+
+
+class OrderingPlugin(object):
+    # pylint: disable=missing-docstring
+
+    def __init__(self, config):
+        self._cache = config.cache
+        self._root = str(config.rootdir)
+        self._started = None
+        self._first_failure = None
+        self._counts = (0, 0)
+        self._deselected = False
+        self._scheduled = 0
+        self._finished = 0
+
+    def pytest_sessionstart(self):
+        self._started = time.time()
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, items):
+        failed = self._cache.get(LAST_FAILED, {})
+        previous = self._cache.get(MTIMES, {})
+        # Everything is new on the first run, nothing to prioritize
+        changed = previous and changed_modules(
+            previous, source_mtimes(self._root)
+        )
+
+        def _rank(item):
+            if item.nodeid in failed:
+                return 0
+            if changed and refers_to(item, changed):
+                return 1
+            return 2
+
+        ranks = {item.nodeid: _rank(item) for item in items}
+        items.sort(key=lambda item: ranks[item.nodeid])
+        self._scheduled = len(items)
+        self._counts = (
+            sum(1 for rank in ranks.values() if rank == 0),
+            sum(1 for rank in ranks.values() if rank == 1),
+        )
+
+    def pytest_deselected(self):
+        self._deselected = True
+
+    def pytest_report_collectionfinish(self):
+        return "running first: {} previously failed, {} related to " \
+            "changed modules".format(*self._counts)
+
+    def pytest_runtest_logfinish(self):
+        self._finished += 1
+
+    def pytest_runtest_logreport(self, report):
+        if report.failed and self._first_failure is None:
+            self._first_failure = time.time() - self._started
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self._first_failure is None:
+            terminalreporter.write_line("time to first failure: none")
+        else:
+            terminalreporter.write_line(
+                "time to first failure: {:.2f}s".format(self._first_failure)
+            )
+        self._cache.set(TIME_TO_FIRST_FAILURE, self._first_failure)
+
+    def pytest_sessionfinish(self, exitstatus):
+        # Otherwise changes of the modules whose tests did not run would be
+        # taken as seen
+        if exitstatus in _COMPLETED and not self._deselected and \
+                self._finished == self._scheduled:
+            self._cache.set(MTIMES, source_mtimes(self._root))
+
+
+def pytest_configure(config):
+    # pylint: disable=missing-docstring
+    config.pluginmanager.register(OrderingPlugin(config), "ordering-session")
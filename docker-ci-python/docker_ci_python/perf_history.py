@@ -0,0 +1,309 @@
+"""
+Performance history of the toolchain kept in a SQLite database in the
+project directory.
+
+Every command run stores the wall and CPU time and the resource usage of
+its stages - the tools it spawned - together with the size of the project,
+so that the stages which became slower than they used to be can be
+spotted.
+"""
+
+import collections
+import contextlib
+import os
+import re
+import threading
+import time
+
+from .resources import ResourceUsage, combine, format_bytes
+
+DATABASE = ".perf-history.sqlite"
+TOTAL = "total"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    command TEXT NOT NULL,
+    started REAL NOT NULL,
+    succeeded INTEGER NOT NULL,
+    packages INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    tests INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stages (
+    run INTEGER NOT NULL REFERENCES runs(id),
+    name TEXT NOT NULL,
+    wall REAL NOT NULL,
+    cpu REAL NOT NULL,
+    -- ResourceUsage of the stage, NULL if unknown
+    max_rss INTEGER,
+    user_cpu REAL,
+    system_cpu REAL,
+    blocks_in INTEGER,
+    blocks_out INTEGER,
+    voluntary_switches INTEGER,
+    involuntary_switches INTEGER
+);
+"""
+
+Stage = collections.namedtuple("Stage", ["name", "wall", "cpu", "usage"])
+
+_TEST = re.compile(r"^\s*(async\s+)?def\s+test", re.MULTILINE)
+
+
+def _children_cpu():
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+def stage_name(args):
+    """
+    >>> stage_name(["env", "A=1", "pytest", "-q"])
+    'pytest'
+    >>> stage_name(["python", "-m", "docker_ci_python.doctests"])
+    'docker_ci_python.doctests'
+    >>> stage_name(["python", "/build/configs/setup.py", "bdist_wheel"])
+    'setup.py'
+    >>> stage_name(["env", "A=1"])
+    '?'
+    """
+    args = list(args)
+    while args and (args[0] == "env" or "=" in args[0]):
+        args.pop(0)
+    if not args:
+        return "?"
+    if os.path.basename(args[0]).startswith("python") and len(args) > 1:
+        if args[1] == "-m" and len(args) > 2:
+            return args[2]
+        return os.path.basename(args[1])
+    return os.path.basename(args[0])
+
+
+class StageTimer(object):
+    """Measures wall and CPU time of the stages of a command."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = []
+
+    def run(self, name, function, *args):
+        """
+        Calls the function as a stage. Resource usage of the stage is taken
+        from the result of the function or from the exception it raised.
+        Without it CPU time is the one of the finished child processes,
+        which is only exact for stages run one at a time.
+        """
+        wall = time.time()
+        cpu = _children_cpu()
+        usage = None
+        try:
+            result = function(*args)
+            usage = getattr(result, "usage", None)
+            return result
+        except Exception as error:
+            usage = getattr(error, "usage", None)
+            raise
+        finally:
+            if isinstance(usage, ResourceUsage):
+                cpu = usage.user_cpu + usage.system_cpu
+            else:
+                usage = None
+                cpu = _children_cpu() - cpu
+            with self._lock:
+                self.stages.append(
+                    Stage(name, time.time() - wall, cpu, usage)
+                )
+
+
+def _python_files(path):
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [name for name in dirs if not name.startswith(".")]
+        for name in files:
+            if name.endswith(".py"):
+                yield os.path.join(root, name)
+
+
+def project_counts(project_path, packages):
+    """
+    :return: number of packages, python files and test functions
+    :rtype: tuple
+    """
+    files = 0
+    tests = 0
+    for directory in packages + ["tests", "integration_tests"]:
+        for fil in _python_files(os.path.join(project_path, directory)):
+            files += 1
+            if directory in packages:
+                continue
+            with open(fil, errors="replace") as stream:
+                tests += len(_TEST.findall(stream.read()))
+    return len(packages), files, tests
+
+
+def _connect(path):
+    import sqlite3
+    connection = sqlite3.connect(path)
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+def _usage_values(usage):
+    return tuple(usage) if usage else (None, ) * len(ResourceUsage._fields)
+
+
+def _sum(name, stages, wall):
+    usages = [stage.usage for stage in stages if stage.usage]
+    return Stage(
+        name, wall, sum(stage.cpu for stage in stages),
+        combine(usages) if len(usages) == len(stages) else None
+    )
+
+
+def aggregate(stages):
+    """
+    Sums up the stages with the same name. Peak memory of an aggregate is
+    the largest one among its stages, the usage is only known if it is
+    known for all of them.
+
+    :rtype: list
+    """
+    groups = collections.OrderedDict()
+    for stage in stages:
+        groups.setdefault(stage.name, []).append(stage)
+    return [
+        _sum(name, group, sum(stage.wall for stage in group))
+        for name, group in groups.items()
+    ]
+
+
+def record(path, command, started, succeeded, counts, stages):
+    """
+    Stores a command run. Stages with the same name are summed up and
+    the whole run is stored as the total stage.
+    """
+    rows = aggregate(stages) + [_sum(TOTAL, stages, time.time() - started)]
+    with contextlib.closing(_connect(path)) as connection:
+        with connection:
+            run = connection.execute(
+                "INSERT INTO runs "
+                "(command, started, succeeded, packages, files, tests) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (command, started, int(succeeded)) + tuple(counts)
+            ).lastrowid
+            connection.executemany(
+                "INSERT INTO stages (run, name, wall, cpu, {}) "
+                "VALUES (?, ?, ?, ?, {})".format(
+                    ", ".join(ResourceUsage._fields),
+                    ", ".join("?" for _ in ResourceUsage._fields)
+                ), [(run, stage.name, stage.wall, stage.cpu) +
+                    _usage_values(stage.usage) for stage in rows]
+            )
+
+
+def _median(values):
+    """
+    >>> _median([3.0, 1.0, 2.0])
+    2.0
+    >>> _median([4.0, 1.0, 3.0, 2.0])
+    2.5
+    """
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def trends(path, window):
+    """
+    Compares the latest successful run of every stage with the median of
+    up to ``window`` successful runs before it.
+
+    :return: (command, stage, number of runs, latest wall time, baseline
+             wall time or None, latest CPU time) tuples
+    :rtype: list
+    """
+    if not os.path.exists(path):
+        return []
+    with contextlib.closing(_connect(path)) as connection:
+        rows = connection.execute(
+            "SELECT runs.command, stages.name, stages.wall, stages.cpu "
+            "FROM stages JOIN runs ON stages.run = runs.id "
+            "WHERE runs.succeeded ORDER BY runs.id"
+        ).fetchall()
+    history = {}
+    for command, name, wall, cpu in rows:
+        history.setdefault((command, name), []).append((wall, cpu))
+    result = []
+    for (command, name), runs in sorted(history.items()):
+        latest_wall, latest_cpu = runs[-1]
+        previous = [wall for wall, _ in runs[-window - 1:-1]]
+        result.append((
+            command, name, len(runs), latest_wall,
+            _median(previous) if previous else None, latest_cpu
+        ))
+    return result
+
+
+def regressions(stage_trends, threshold, min_runs):
+    """
+    :return: the trends of the stages that got slower than their baseline
+             by more than the threshold (0.2 is 20%)
+    :rtype: list
+    """
+    return [
+        trend for trend in stage_trends
+        if trend[4] is not None and trend[2] > min_runs
+        and trend[3] > trend[4] * (1 + threshold)
+    ]
+
+
+def summary_lines(stages, counters):
+    """
+    Renders the resources used by the stages of a command and by the whole
+    container.
+
+    :param counters: result of ``resources.cgroup_counters``
+    :type counters: dict
+    """
+    row = "{:<28} {:>8} {:>8} {:>8} {:>10} {:>8} {:>8} {:>13}"
+    lines = [
+        row.format(
+            "stage", "wall", "user", "system", "peak rss", "blk in",
+            "blk out", "ctx vol/invol"
+        )
+    ]
+    for stage in aggregate(stages):
+        usage = stage.usage
+        lines.append(
+            row.format(
+                stage.name, "{:.2f}s".format(stage.wall),
+                *([
+                    "{:.2f}s".format(usage.user_cpu),
+                    "{:.2f}s".format(usage.system_cpu),
+                    format_bytes(usage.max_rss), usage.blocks_in,
+                    usage.blocks_out, "{}/{}".format(
+                        usage.voluntary_switches, usage.involuntary_switches
+                    )
+                ] if usage else ["-"] * 6)
+            )
+        )
+    container = []
+    if "peak_memory" in counters:
+        container.append(
+            "peak memory {}{}".format(
+                format_bytes(counters["peak_memory"]),
+                " of {}".format(format_bytes(counters["memory_limit"]))
+                if "memory_limit" in counters else ""
+            )
+        )
+    if "oom_kills" in counters:
+        container.append("{} OOM kills".format(counters["oom_kills"]))
+    for key, title in [("read_bytes", "read"), ("written_bytes", "written")]:
+        if key in counters:
+            container.append(
+                "{} {}".format(title, format_bytes(counters[key]))
+            )
+    if container:
+        lines.append("container: " + ", ".join(container))
+    return lines
@@ -0,0 +1,187 @@
+"""
+Pytest plugin that samples the call stacks of a test run.
+
+Load it with ``-p docker_ci_python.profiling``. The samples are aggregated
+per test and for the whole session and written as:
+
+- a collapsed stack file that can be fed into ``flamegraph.pl`` or
+  speedscope directly;
+- a text report with per test totals and the hottest functions.
+"""
+
+from __future__ import print_function
+
+import collections
+import os
+import signal
+
+import pytest
+
+SESSION = "<session>"
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return "{} ({}:{})".format(
+        code.co_name, os.path.relpath(code.co_filename), code.co_firstlineno
+    )
+
+
+def _stack(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return tuple(reversed(names))
+
+
+class StackSampler(object):
+    """
+    Collects call stacks on SIGPROF, i.e. once per ``interval`` seconds of
+    CPU time consumed by the process. Time spent sleeping or waiting for I/O
+    is therefore not sampled.
+    """
+
+    def __init__(self, interval):
+        self._interval = interval
+        self._previous_handler = None
+        self.label = SESSION
+        # label -> stack -> number of samples
+        self.samples = collections.defaultdict(collections.Counter)
+
+    def start(self):
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self._interval, self._interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+
+    def _sample(self, _signum, frame):
+        self.samples[self.label][_stack(frame)] += 1
+
+
+def collapsed_lines(samples):
+    """
+    Renders samples in the collapsed stack format: one line per unique stack
+    with frames separated by semicolons and followed by the sample count.
+    The test id is used as the root frame.
+
+    >>> collapsed_lines({"t": {("a", "b"): 3}})
+    ['t;a;b 3']
+    """
+    lines = []
+    for label in sorted(samples):
+        for stack, count in sorted(samples[label].items()):
+            lines.append("{} {}".format(";".join((label, ) + stack), count))
+    return lines
+
+
+def _function_totals(samples):
+    own = collections.Counter()
+    total = collections.Counter()
+    for stacks in samples.values():
+        for stack, count in stacks.items():
+            own[stack[-1]] += count
+            for name in set(stack):
+                total[name] += count
+    return own, total
+
+
+def _percent(part, whole):
+    return "{:6.2f}%".format(100.0 * part / whole if whole else 0)
+
+
+def report_lines(samples, interval, top=30):
+    """
+    Renders a text report sorted by the number of samples: the overall
+    totals, per test totals and the functions with the largest own and
+    cumulative sample counts.
+    """
+    per_label = sorted(
+        ((sum(stacks.values()), label) for label, stacks in samples.items()),
+        reverse=True
+    )
+    overall = sum(count for count, _ in per_label)
+    own, total = _function_totals(samples)
+
+    lines = [
+        "Samples: {} ({:.3f}s of CPU time, interval {}s)".format(
+            overall, overall * interval, interval
+        ),
+        "",
+        "Per test:",
+    ]
+    lines.extend(
+        "{:>8} {} {:9.3f}s  {}".format(
+            count, _percent(count, overall), count * interval, label
+        ) for count, label in per_label
+    )
+    for title, counter in [("Own time:", own), ("Cumulative time:", total)]:
+        lines.extend(["", title])
+        lines.extend(
+            "{:>8} {}  {}".format(count, _percent(count, overall), name)
+            for name, count in counter.most_common(top)
+        )
+    return lines
+
+
+def _write(path, lines):
+    with open(path, "w") as fil:
+        fil.write("\n".join(lines) + "\n")
+
+
+class ProfilingPlugin(object):
+    # pylint: disable=missing-docstring
+
+    def __init__(self, config):
+        self._config = config
+        self._interval = config.getoption("profile_interval")
+        self._sampler = StackSampler(self._interval)
+
+    def pytest_sessionstart(self):
+        self._sampler.start()
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item):
+        self._sampler.label = item.nodeid
+        yield
+        self._sampler.label = SESSION
+
+    def pytest_sessionfinish(self):
+        self._sampler.stop()
+        samples = self._sampler.samples
+        _write(
+            self._config.getoption("profile_collapsed"),
+            collapsed_lines(samples)
+        )
+        _write(
+            self._config.getoption("profile_report"),
+            report_lines(samples, self._interval)
+        )
+
+
+def pytest_addoption(parser):
+    # pylint: disable=missing-docstring
+    group = parser.getgroup("profiling")
+    group.addoption(
+        "--profile-interval",
+        type=float,
+        default=0.005,
+        help="CPU time in seconds between two stack samples"
+    )
+    group.addoption(
+        "--profile-collapsed",
+        default="profile.collapsed",
+        help="where to write collapsed stacks for flame graphs"
+    )
+    group.addoption(
+        "--profile-report",
+        default="profile.txt",
+        help="where to write the sorted text report"
+    )
+
+
+def pytest_configure(config):
+    # pylint: disable=missing-docstring
+    config.pluginmanager.register(ProfilingPlugin(config), "profiling-session")
@@ -0,0 +1,148 @@
+"""
+Resources used by the spawned tools and by the whole container.
+"""
+
+import collections
+import os
+
+CGROUP = "/sys/fs/cgroup"
+
+ResourceUsage = collections.namedtuple(
+    "ResourceUsage", [
+        "max_rss",  # bytes
+        "user_cpu",  # seconds
+        "system_cpu",  # seconds
+        "blocks_in",
+        "blocks_out",
+        "voluntary_switches",
+        "involuntary_switches",
+    ]
+)
+
+
+def from_rusage(rusage):
+    """
+    Converts the result of wait4 or getrusage. Note that the usage of
+    a waited for process includes the one of its waited for descendants,
+    e.g. of the tool run by sudo.
+    """
+    return ResourceUsage(
+        max_rss=rusage.ru_maxrss * 1024,  # kilobytes on Linux
+        user_cpu=rusage.ru_utime,
+        system_cpu=rusage.ru_stime,
+        blocks_in=rusage.ru_inblock,
+        blocks_out=rusage.ru_oublock,
+        voluntary_switches=rusage.ru_nvcsw,
+        involuntary_switches=rusage.ru_nivcsw,
+    )
+
+
+def combine(usages):
+    """
+    Sums up the usage of processes run one after another. Peak memory is
+    the largest one of them.
+
+    :rtype: ResourceUsage
+    """
+    usages = list(usages)
+    if not usages:
+        return None
+    return ResourceUsage(
+        max(usage.max_rss for usage in usages),
+        *[sum(values) for values in list(zip(*usages))[1:]]
+    )
+
+
+def _read(*names):
+    try:
+        with open(os.path.join(CGROUP, *names)) as fil:
+            return fil.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def _number(value):
+    return None if value in (None, "", "max") else int(value)
+
+
+def _limit(value):
+    # cgroup v1 reports the lack of a limit as a huge number
+    limit = _number(value)
+    return None if limit is None or limit >= 1 << 60 else limit
+
+
+def _fields(value):
+    # "key number" lines, e.g. of memory.events
+    result = collections.Counter()
+    for line in (value or "").splitlines():
+        pair = line.split()
+        if len(pair) == 2 and pair[1].isdigit():
+            result[pair[0]] += int(pair[1])
+    return result
+
+
+def _io_bytes(value):
+    # "device key=number ..." lines of io.stat (v2)
+    result = collections.Counter()
+    for line in (value or "").splitlines():
+        for field in line.split()[1:]:
+            key, _, number = field.partition("=")
+            if number.isdigit():
+                result[key] += int(number)
+    return result
+
+
+def _blkio_bytes(value):
+    # "device key number" lines of blkio.throttle.io_service_bytes (v1)
+    result = collections.Counter()
+    for line in (value or "").splitlines():
+        fields = line.split()
+        if len(fields) == 3 and fields[2].isdigit():
+            result[fields[1]] += int(fields[2])
+    return result
+
+
+def cgroup_counters():
+    """
+    Reads the counters of the container's cgroup. Both cgroup v2 and v1
+    layouts are supported, unavailable counters are left out.
+
+    :return: peak_memory, memory_limit, oom_kills, read_bytes, written_bytes
+    :rtype: dict
+    """
+    if _read("cgroup.controllers") is not None:  # cgroup v2
+        io_stat = _io_bytes(_read("io.stat"))
+        counters = {
+            "peak_memory": _number(_read("memory.peak")),
+            "memory_limit": _limit(_read("memory.max")),
+            "oom_kills": _fields(_read("memory.events")).get("oom_kill"),
+            "read_bytes": io_stat.get("rbytes"),
+            "written_bytes": io_stat.get("wbytes"),
+        }
+    else:
+        io_service = _blkio_bytes(
+            _read("blkio", "blkio.throttle.io_service_bytes")
+        )
+        counters = {
+            "peak_memory": _number(
+                _read("memory", "memory.max_usage_in_bytes")
+            ),
+            "memory_limit": _limit(_read("memory", "memory.limit_in_bytes")),
+            "oom_kills": _fields(_read("memory", "memory.oom_control")
+                                 ).get("oom_kill"),
+            "read_bytes": io_service.get("Read"),
+            "written_bytes": io_service.get("Write"),
+        }
+    return {key: value for key, value in counters.items() if value is not None}
+
+
+def format_bytes(value):
+    """
+    >>> format_bytes(1536)
+    '1.5KiB'
+    """
+    for unit in ["B", "KiB", "MiB"]:
+        if value < 1024:
+            return "{:.1f}{}".format(value, unit)
+        value /= 1024.0
+    return "{:.1f}GiB".format(value)
@@ -1,7 +1,10 @@
 from __future__ import print_function
 
+import os
 import subprocess
 
+from .resources import from_rusage
+
 # This prefix is necessary to prevent Docker from buffering Python subprocess
 # output to pipe. This is required to e.g. enable continuous monitoring of
 # unit test or integration test execution.
@@ -9,7 +12,42 @@ UNBUFFER_PREFIX = ["stdbuf", "-oL", "-eL"]
 
 
 class CommandException(subprocess.CalledProcessError):
-    """Exception which is raised if the command fails to execute."""
+    """
+    Exception which is raised if the command fails to execute.
+
+    :ivar usage: resources used by the command
+    :vartype usage: ResourceUsage
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, returncode, cmd, output=None, stderr=None,
+                 usage=None):
+        super(CommandException, self).__init__(returncode, cmd, output, stderr)
+        self.usage = usage
+
+
+class CommandOutput(str):
+    """
+    Output of a command which also carries the resources the command used.
+
+    :ivar usage: resources used by the command
+    :vartype usage: ResourceUsage
+    """
+
+    def __new__(cls, value, usage=None):
+        output = super(CommandOutput, cls).__new__(cls, value)
+        output.usage = usage
+        return output
+
+
+def _wait(process):
+    # Unlike process.wait() wait4 also reports the resources used
+    _, status, rusage = os.wait4(process.pid, 0)
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    return process.returncode, from_rusage(rusage)
 
 
 def _run_yieldable_command(command):
@@ -26,14 +64,22 @@ def _run_yieldable_command(command):
 
     process.stdout.close()
 
-    status = process.wait()
+    status, usage = _wait(process)
 
     if status:
-        raise CommandException(status, command)
+        raise CommandException(status, command, usage=usage)
+
+    return usage
 
 
 def _run_with_accumulation(accumulator, command, silent, printable, capture):
-    for line in _run_yieldable_command(command):
+    lines = iter(_run_yieldable_command(command))
+    while True:
+        try:
+            line = next(lines)
+        except StopIteration as stop:
+            # Resource usage is the return value of the generator
+            return stop.value
         if printable(line):
             if capture:
                 accumulator.append(line)
@@ -58,8 +104,8 @@ def run_command(command, silent=False, printable=None, capture=False):
     :param capture: if True - all output shall be accumulated and returned
                     as a giant string
     :type capture: bool
-    :return: output of the command
-    :rtype: str
+    :return: output of the command with the resources it used attached
+    :rtype: CommandOutput
     :raises: CommandException if the status code returned by the command is > 0
     """
     lines = []
@@ -68,7 +114,7 @@ def run_command(command, silent=False, printable=None, capture=False):
         return "".join(lines).rstrip("\n")
 
     try:
-        _run_with_accumulation(
+        usage = _run_with_accumulation(
             accumulator=lines,
             command=UNBUFFER_PREFIX + command,
             silent=silent,
@@ -76,5 +122,7 @@ def run_command(command, silent=False, printable=None, capture=False):
             capture=capture
         )
     except CommandException as error:
-        raise CommandException(error.returncode, command, _msg())
-    return _msg()
+        raise CommandException(
+            error.returncode, command, _msg(), usage=error.usage
+        )
+    return CommandOutput(_msg(), usage)
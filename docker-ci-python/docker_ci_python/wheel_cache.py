@@ -0,0 +1,131 @@
+"""
+Content addressed store of built wheels.
+
+Every entry is a directory named after the digest of the files the wheels
+were built from. Entries are evicted in least recently used order once the
+store grows beyond its size limit.
+"""
+
+import os
+import shutil
+
+
+def _walk(path):
+    if os.path.isfile(path):
+        yield path
+        return
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(name for name in dirs if name != "__pycache__")
+        for name in sorted(files):
+            if not name.endswith((".pyc", ".pyo")):
+                yield os.path.join(root, name)
+
+
+def source_digest(root, paths):
+    """
+    Computes a digest of the contents and relative locations of all the
+    files found under ``paths``. Missing paths are skipped.
+
+    :param root: directory relative to which file names are hashed
+    :type root: str
+    :param paths: files and directories to hash
+    :type paths: list
+    :return: hex digest
+    :rtype: str
+    """
+    # Loading OpenSSL bindings is noticeable on CLI startup
+    import hashlib
+    digest = hashlib.sha256()
+    for path in paths:
+        for fil in _walk(path):
+            digest.update(os.path.relpath(fil, root).encode("utf-8"))
+            digest.update(b"\0")
+            with open(fil, "rb") as stream:
+                for chunk in iter(lambda: stream.read(1 << 16), b""):
+                    digest.update(chunk)
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _size(path):
+    return sum(os.path.getsize(fil) for fil in _walk(path))
+
+
+class WheelCache(object):
+    """
+    :param path: directory of the store
+    :type path: str
+    :param max_size: maximal total size of the stored wheels in bytes
+    :type max_size: int
+    """
+
+    def __init__(self, path, max_size):
+        self._path = path
+        self._max_size = max_size
+
+    def _entry(self, digest):
+        return os.path.join(self._path, digest)
+
+    def get(self, digest):
+        """
+        :return: paths of the wheels stored under the digest or an empty list
+        :rtype: list
+        """
+        entry = self._entry(digest)
+        if not os.path.isdir(entry):
+            return []
+        os.utime(entry, None)  # mark as recently used
+        return [
+            os.path.join(entry, name) for name in sorted(os.listdir(entry))
+        ]
+
+    def put(self, digest, wheels):
+        """Stores copies of the wheels under the digest."""
+        entry = self._entry(digest)
+        tmp = entry + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for wheel in wheels:
+            shutil.copy2(wheel, tmp)
+        shutil.rmtree(entry, ignore_errors=True)
+        os.rename(tmp, entry)
+
+    def entries(self):
+        """
+        :return: (digest, size in bytes, last use timestamp, wheel names)
+                 tuples ordered from the most recently used one
+        :rtype: list
+        """
+        if not os.path.isdir(self._path):
+            return []
+        result = []
+        for digest in os.listdir(self._path):
+            entry = self._entry(digest)
+            if digest.endswith(".tmp") or not os.path.isdir(entry):
+                continue
+            result.append((
+                digest, _size(entry), os.path.getmtime(entry),
+                sorted(os.listdir(entry))
+            ))
+        return sorted(result, key=lambda it: it[2], reverse=True)
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the store fits into
+        its size limit.
+
+        :return: digests of the removed entries
+        :rtype: list
+        """
+        removed = []
+        total = 0
+        for digest, size, _, _ in self.entries():
+            total += size
+            if total > self._max_size:
+                shutil.rmtree(self._entry(digest), ignore_errors=True)
+                removed.append(digest)
+        return removed
+
+    def clear(self):
+        """Removes the whole store."""
+        shutil.rmtree(self._path, ignore_errors=True)
@@ -0,0 +1,73 @@
+import os
+
+from docker_ci_python import artifacts
+
+from .base_test import BaseTest
+
+
+class ArtifactsTest(BaseTest):
+
+    def setUp(self):
+        self.root = self.temp_dir()
+
+    def _path(self, *names):
+        return os.path.join(self.root, *names)
+
+    def _touch(self, *names):
+        self.write_file(self._path(*names))
+
+    def test_find(self):
+        self._touch("one.egg-info", "PKG-INFO")
+        self._touch("coverage.xml")
+        self._touch("setup.yml")
+        self.assertEqual(["coverage.xml", "one.egg-info"],
+                         artifacts.find(
+                             self.root, ["*.egg-info", "coverage.xml", "dist"]
+                         ))
+
+    def test_produced(self):
+        self._touch("build", "lib", "mod.py")
+        self._touch("dist", "own.whl")
+        self._touch("coverage.xml")
+        patterns = ["build", "dist", "coverage.xml", "gen-docs"]
+        before = artifacts.snapshot(self.root, patterns)
+        self._touch("dist", "new.whl")
+        os.utime(self._path("coverage.xml"), ns=(1, 1))
+        self._touch("gen-docs", "index.rst")
+        self.assertEqual(["coverage.xml", "dist", "gen-docs"],
+                         artifacts.produced(
+                             before, artifacts.snapshot(self.root, patterns)
+                         ))
+
+    def test_manifest(self):
+        self.assertFalse(artifacts.exists(self.root))
+        self.assertEqual([], artifacts.load(self.root))
+        artifacts.record(self.root, ["dist", "build"])
+        artifacts.record(self.root, ["dist", "gen-docs"])
+        self.assertEqual(["build", "dist", "gen-docs"],
+                         artifacts.load(self.root))
+        self.assertTrue(artifacts.exists(self.root))
+
+    def test_remove_all(self):
+        self._touch("coverage", "index.html")
+        self._touch("coverage", "nested", "deep", "file.html")
+        self._touch("coverage.xml")
+        self._touch("keep.py")
+        os.symlink(self._path("keep.py"), self._path("coverage", "link"))
+        artifacts.remove_all([
+            self._path("coverage"),
+            self._path("coverage.xml"),
+            self._path("missing"),
+        ])
+        self.assertEqual(["keep.py"], os.listdir(self.root))
+
+    def test_entries_removed_concurrently(self):
+        self._touch("coverage", "index.html")
+        self._touch("coverage", "nested", "file.html")
+        with os.scandir(self._path("coverage")) as entries:
+            stale = list(entries)
+        artifacts.remove_all([self._path("coverage", "nested")])
+        os.unlink(self._path("coverage", "index.html"))
+        for entry in stale:
+            artifacts._rm_entry(entry)
+        self.assertEqual([], os.listdir(self._path("coverage")))
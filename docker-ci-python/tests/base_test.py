@@ -1,5 +1,8 @@
 from abc import ABCMeta, abstractmethod
 
+import os
+import shutil
+import tempfile
 import unittest
 
 from unittest import mock
@@ -29,3 +32,14 @@ class BaseTest(unittest.TestCase):
         patch = target.start()
         self.addCleanup(target.stop)
         return patch
+
+    def temp_dir(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        return path
+
+    @staticmethod
+    def write_file(path, content=""):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as fil:
+            fil.write(content)
@@ -0,0 +1,203 @@
+import doctest
+import json
+import os
+import sys
+
+from unittest import mock
+
+from docker_ci_python import doctests
+
+from .base_test import BaseTest
+
+BASE = BaseTest.with_module("docker_ci_python.doctests")
+
+MODULE = '''
+def double(value):
+    """
+    >>> double(2)
+    {}
+    """
+    return value * 2
+'''
+
+
+class DoctestsTest(BASE):  # type: ignore
+
+    def setUp(self):
+        self.root = self.temp_dir()
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        self.addCleanup(os.chdir, cwd)
+        self.addCleanup(setattr, sys, "path", list(sys.path))
+        self.addCleanup(doctests._forget, ["dtpkg"])
+        self.write_file(os.path.join(self.root, "pytest.ini"), "[pytest]\n")
+        self._write("__init__.py", "")
+        self._write("mod.py", MODULE.format(4))
+        self.print_f = self.patch("print")
+        self.write_coverage = self.patch("write_coverage")
+
+    def _write(self, name, content):
+        self.write_file(os.path.join(self.root, "dtpkg", name), content)
+
+    def _run(self):
+        return doctests.run(["dtpkg"], "cache.json", ".coverage.doctest")
+
+    def _lines(self):
+        return self.write_coverage.call_args[0][1]
+
+    def test_modules(self):
+        self._write("data.txt", "")
+        self.assertEqual([
+            ("dtpkg", os.path.join("dtpkg", "__init__.py")),
+            ("dtpkg.mod", os.path.join("dtpkg", "mod.py")),
+        ], list(doctests._modules("dtpkg")))
+
+    def test_run_and_cache(self):
+        self.assertEqual(0, self._run())
+        with open("cache.json") as fil:
+            cache = json.load(fil)
+        self.assertEqual(1, cache["dtpkg.mod"]["tries"])
+        mod = os.path.realpath(os.path.join("dtpkg", "mod.py"))
+        self.assertEqual([2, 7], self._lines()[mod])
+
+        run_module = self.patch("run_module")
+        self.assertEqual(0, self._run())
+        self.assertFalse(run_module.called)
+        self.assertEqual([2, 7], self._lines()[mod])
+
+    def test_changed_module_is_run_again(self):
+        self._run()
+        self._write("mod.py", "\n" + MODULE.format(4))
+        run_module = self.patch(
+            "run_module", mock.Mock(return_value=(0, 1, {}))
+        )
+        self._run()
+        run_module.assert_called_once_with(
+            "dtpkg.mod", os.path.join("dtpkg", "mod.py"), ["dtpkg"],
+            doctest.ELLIPSIS
+        )
+
+    def test_option_flags(self):
+        self.write_file(
+            os.path.join(self.root, "pytest.ini"),
+            "[pytest]\ndoctest_optionflags = NORMALIZE_WHITESPACE\n"
+        )
+        self._write("mod.py", MODULE.format("[1,\n    2]").replace(
+            "double(2)", "[1, 2]"
+        ))
+        self.assertEqual(0, self._run())
+
+    def test_changed_flags_run_modules_again(self):
+        self._run()
+        self.write_file(
+            os.path.join(self.root, "pytest.ini"),
+            "[pytest]\ndoctest_optionflags = ELLIPSIS NORMALIZE_WHITESPACE\n"
+        )
+        run_module = self.patch(
+            "run_module", mock.Mock(return_value=(0, 1, {}))
+        )
+        self._run()
+        self.assertEqual(2, run_module.call_count)
+
+    def test_failure_is_not_cached(self):
+        self._write("mod.py", MODULE.format(5))
+        self.assertEqual(1, self._run())
+        with open("cache.json") as fil:
+            self.assertNotIn("dtpkg.mod", json.load(fil))
+
+    def test_corrupt_cache_is_ignored(self):
+        with open("cache.json", "w") as fil:
+            fil.write("{")
+        run_module = self.patch(
+            "run_module", mock.Mock(return_value=(0, 1, {}))
+        )
+        self.assertEqual(0, self._run())
+        self.assertEqual(2, run_module.call_count)
+
+    def test_import_error(self):
+        self._write("mod.py", "import nonexistent_module_for_doctests")
+        self.patch("traceback")
+        self.assertEqual(1, self._run())
+
+    def test_run_doctests(self):
+        sys.path.insert(0, self.root)
+        runner = doctest.DocTestRunner()
+        self.assertTrue(doctests.run_doctests("dtpkg.mod", runner))
+        self.assertEqual((0, 1), (runner.failures, runner.tries))
+
+    def test_run_doctests_import_error(self):
+        self._write("mod.py", "import nonexistent_module_for_doctests")
+        self.patch("traceback")
+        self.assertFalse(
+            doctests.run_doctests("dtpkg.mod", doctest.DocTestRunner())
+        )
+
+    def test_measurement_is_stopped_on_import_error(self):
+        # A real measurement would pause the one of the test suite
+        measurement = mock.patch("coverage.Coverage")
+        cov = measurement.start().return_value
+        self.addCleanup(measurement.stop)
+        self.patch("run_doctests", mock.Mock(return_value=False))
+        self.assertEqual((1, 0, {}),
+                         doctests.run_module("dtpkg.mod", "path", ["dtpkg"]))
+        self.assertEqual([mock.call.start(), mock.call.stop()],
+                         cov.mock_calls)
+
+    def test_main_fails(self):
+        self.patch("run", mock.Mock(return_value=1))
+        with self.assertRaises(SystemExit):
+            doctests.main(["--cache=c", "--data-file=d", "dtpkg"])
+
+
+class OptionFlagsTest(BASE):  # type: ignore
+
+    def setUp(self):
+        self.root = self.temp_dir()
+        self.nested = os.path.join(self.root, "project", "nested")
+        os.makedirs(self.nested)
+        self.print_f = self.patch("print")
+
+    def _ini(self, name, content):
+        self.write_file(os.path.join(self.root, "project", name), content)
+
+    def test_parent_directory(self):
+        self._ini(
+            "tox.ini", "[tox]\n[pytest]\ndoctest_optionflags = "
+            "NORMALIZE_WHITESPACE IGNORE_EXCEPTION_DETAIL\n"
+        )
+        self.assertEqual(
+            doctest.NORMALIZE_WHITESPACE | doctest.IGNORE_EXCEPTION_DETAIL,
+            doctests.option_flags(self.nested)
+        )
+
+    def test_file_without_section_is_skipped(self):
+        self._ini("tox.ini", "[tox]\n")
+        self._ini(
+            "setup.cfg", "[tool:pytest]\ndoctest_optionflags = SKIP\n"
+        )
+        self.assertEqual(doctest.SKIP, doctests.option_flags(self.nested))
+
+    def test_default(self):
+        self._ini("pytest.ini", "[pytest]\n")
+        self.assertEqual(doctest.ELLIPSIS, doctests.option_flags(self.nested))
+
+    def test_pytest_only_flags(self):
+        self._ini("pytest.ini", "[pytest]\ndoctest_optionflags = NUMBER\n")
+        self.assertEqual(0, doctests.option_flags(self.nested))
+        self.print_f.assert_called_once_with(
+            "Unsupported doctest option flag NUMBER"
+        )
+
+
+class WriteCoverageTest(BaseTest):
+
+    def test_write(self):
+        import coverage
+        path = os.path.join(self.temp_dir(), ".coverage.doctest")
+        doctests.write_coverage(path, {"/src/old.py": [1]})
+        doctests.write_coverage(path, {"/src/mod.py": [1, 2]})
+        cov = coverage.Coverage(data_file=path)
+        cov.load()
+        data = cov.get_data()
+        self.assertEqual([1, 2], sorted(data.lines("/src/mod.py")))
+        self.assertEqual(["/src/mod.py"], list(data.measured_files()))
@@ -1,9 +1,13 @@
+import os
+import sys
+
 from unittest import mock
 
 from docker_ci_python.run_command import CommandException
 
 from docker_ci_python.entrypoint import EntryPoint, ModuleUtils, \
-    _run_for_project, _exists, _run_with_safe_error, _rm
+    _run_for_project, _exists, _run_with_safe_error, _give_to_project_owner, \
+    _wheels
 
 from .base_test import BaseTest
 
@@ -13,14 +17,6 @@ BASE = BaseTest.with_module("docker_ci_python.entrypoint")
 
 class UtilsTest(BASE):  # type: ignore
 
-    def test_rm(self):
-        self.patch("os.path.exists", lambda path: path == "/project/exists")
-        remove = self.patch("os.remove")
-        rmtree = self.patch("shutil.rmtree")
-        _rm("/project", "exists")
-        remove.assert_called_once_with("/project/exists")
-        rmtree.assert_called_once_with("/project/exists", ignore_errors=True)
-
     def test_exists(self):
         self.patch("os.path.exists", lambda path: path == "/parent/exists")
         self.assertTrue(_exists("/parent", "exists"))
@@ -37,6 +33,14 @@ class UtilsTest(BASE):  # type: ignore
         with self.assertRaises(CommandException):
             _run_with_safe_error(["cmd"], "SAFE")
 
+    def test_wheels(self):
+        dist = os.path.join(self.temp_dir(), "dist")
+        self.assertEqual({}, _wheels(dist))
+        for name in ["one.whl", "one.tar.gz"]:
+            self.write_file(os.path.join(dist, name))
+        os.utime(os.path.join(dist, "one.whl"), (5, 5))
+        self.assertEqual({"one.whl": 5}, _wheels(dist))
+
 
 class ModuleUtilsTest(BASE):  # type: ignore
 
@@ -72,7 +76,9 @@ class ModuleUtilsTest(BASE):  # type: ignore
         self.assertFalse(self.run.called)
 
     def test_get_testable_packages(self):
-        find_pkgs = self.patch("setuptools").find_packages
+        patcher = mock.patch("setuptools.find_packages")
+        find_pkgs = patcher.start()
+        self.addCleanup(patcher.stop)
         find_pkgs.return_value = ["one", "two", "one.subone"]
         self.assertEqual(["one", "two"], self.utils.get_testable_packages())
         find_pkgs.assert_called_once_with(
@@ -158,6 +164,34 @@ class RunForProjectTest(BASE):  # type: ignore
         ], self.run.call_args_list)
 
 
+class GiveToProjectOwnerTest(BASE):  # type: ignore
+
+    def setUp(self):
+        self.root = self.temp_dir()
+        self.write_file(os.path.join(self.root, "dist", "one.whl"))
+        self.stat = mock.Mock(st_uid=42, st_gid=43)
+        stat = os.stat
+        self.patch(
+            "os.stat", lambda path, *args, **kwargs: self.stat
+            if path == self.root else stat(path, *args, **kwargs)
+        )
+        self.chown = self.patch("os.chown")
+
+    def test_recursive(self):
+        dist = os.path.join(self.root, "dist")
+        _give_to_project_owner(self.root, [dist, "/missing"])
+        self.assertEqual([
+            mock.call(dist, 42, 43, follow_symlinks=False),
+            mock.call(os.path.join(dist, "one.whl"), 42, 43,
+                      follow_symlinks=False),
+        ], self.chown.call_args_list)
+
+    def test_root_user(self):
+        self.stat.st_uid = 0
+        _give_to_project_owner(self.root, [os.path.join(self.root, "dist")])
+        self.assertFalse(self.chown.called)
+
+
 class EntryPointTest(BASE):  # type: ignore
 
     # This is intentional to have a bunch of patches
@@ -173,11 +207,21 @@ class EntryPointTest(BASE):  # type: ignore
         self.reformat = utils.reformat_pkg
         self.copy_config = utils.copy_config
 
-        self.listdir = self.patch("os.listdir")
         self.exists_at = self.patch("_exists")
         self.print_f = self.patch("print")
         self.shutil = self.patch("shutil")
-        self.rm = self.patch("_rm")
+        self.artifacts = self.patch("artifacts")
+        self.artifacts.MANIFEST = ".artifacts"
+        self.digest = self.patch("source_digest")
+        self.cache = self.patch("WheelCache").return_value
+        self.wheels = self.patch("_wheels")
+        self.owner = self.patch("_give_to_project_owner")
+        self.record = self.patch("perf_history.record")
+        self.counts = self.patch("perf_history.project_counts")
+        self.trends = self.patch("perf_history.trends")
+        self.summary = self.patch("perf_history.summary_lines")
+        self.summary.return_value = []
+        self.counters = self.patch("resources.cgroup_counters")
         self.ep = EntryPoint("/project", "/etc/docker-python")
 
     def test_help(self):
@@ -185,8 +229,10 @@ class EntryPointTest(BASE):  # type: ignore
         print(self.print_f.call_args_list)
         self.assertEqual([
             mock.call('build'),
-            mock.
-            call('\tProduces a library package in the form of wheel package'),
+            mock.call(
+                '\tProduces a library package in the form of wheel package '
+                'or reuses the one built from exactly the same sources'
+            ),
             mock.call('build-docs'),
             mock.
             call('\tProduces api docs in the form of .rst and .html files'),
@@ -196,6 +242,26 @@ class EntryPointTest(BASE):  # type: ignore
             mock.call('\tConnects into the container\'s bash'),
             mock.call('help'),
             mock.call('\tShows help message'),
+            mock.call('perf-history'),
+            mock.call(
+                '\tShows wall time trends of every stage and fails if a stage '
+                'got slower than its baseline by more than PERF_THRESHOLD '
+                '(0.2 by default), only warns if PERF_WARN_ONLY=1'
+            ),
+            mock.call('profile-tests'),
+            mock.call(
+                '\tRuns unit tests under a sampling profiler and stores per '
+                'test hotspots in profile.txt and flame graph stacks in '
+                'profile.collapsed'
+            ),
+            mock.call('prune-wheel-cache'),
+            mock.call('\tRemoves all the wheels from the build cache'),
+            mock.call('quick-tests'),
+            mock.call(
+                '\tRuns previously failed tests and tests of recently changed '
+                'modules first and reports the time to the first failure, '
+                'stops at the first failure if FAIL_FAST=1'
+            ),
             mock.call('reformat'),
             mock.call('\tReformats the code to have the best possible style'),
             mock.call('repl'),
@@ -203,7 +269,12 @@ class EntryPointTest(BASE):  # type: ignore
             mock.call('static-checks'),
             mock.call('\tRuns pycodestyle, pylint and pyflakes'),
             mock.call('tests'),
-            mock.call('\tRuns unit tests with code coverage')
+            mock.call(
+                '\tRuns unit tests and cached doctests in parallel with '
+                'combined code coverage'
+            ),
+            mock.call('wheel-cache'),
+            mock.call('\tLists the wheels stored in the build cache'),
         ], self.print_f.call_args_list)
 
     def test_repl(self):
@@ -227,31 +298,233 @@ class EntryPointTest(BASE):  # type: ignore
     def test_tests(self):
         self.get_packages.return_value = ["one", "two"]
         self.ep("tests")
-        cmd = [
-            "pytest",
-            "--cov-report=term-missing:skip-covered",
-            "--cov-report=html:coverage",
-            "--cov-report=xml:coverage.xml",
-            "--doctest-modules",
-            "--cov-fail-under=100",
-            "--junit-xml=test-results.xml",
-            "--cov=one",
-            "--cov=two",
+        stages = [
+            [
+                "env",
+                "COVERAGE_FILE=.coverage.unit",
+                "pytest",
+                "--cov-report=",
+                "--junit-xml=test-results.xml",
+                "--cov=one",
+                "--cov=two",
+            ],
+            [
+                "python", "-m", "docker_ci_python.doctests",
+                "--cache=.doctest-cache.json",
+                "--data-file=.coverage.doctest", "one", "two"
+            ],
+        ]
+        calls = self.run.call_args_list
+        # Stages run in parallel, so their order is not defined
+        self.assertCountEqual(
+            [mock.call("/project", cmd) for cmd in stages], calls[:2]
+        )
+        self.assertEqual([
+            mock.call(
+                "/project",
+                ["coverage", "combine", ".coverage.unit", ".coverage.doctest"]
+            ),
+            mock.call(
+                "/project", ["coverage", "html", "--directory=coverage"]
+            ),
+            mock.call("/project", ["coverage", "xml", "-o", "coverage.xml"]),
+            mock.call(
+                "/project", [
+                    "coverage", "report", "--show-missing", "--skip-covered",
+                    "--fail-under=100"
+                ]
+            ),
+        ], calls[2:])
+
+    def test_tests_stage_failure(self):
+        self.get_packages.return_value = ["one"]
+        self.run.side_effect = [
+            None, CommandException(1, ["pytest"], "FAILED")
+        ]
+        self.assertRaises(CommandException, self.ep, "tests")
+        self.assertEqual(2, len(self.run.call_args_list))
+
+    def test_quick_tests(self):
+        self.patch("os.environ", {"FAIL_FAST": "0"})
+        self.ep("quick-tests")
+        self.run.assert_called_once_with(
+            "/project", ["pytest", "-p", "docker_ci_python.ordering"]
+        )
+
+    def test_quick_tests_fail_fast(self):
+        self.patch("os.environ", {"FAIL_FAST": "1"})
+        self.ep("quick-tests")
+        self.run.assert_called_once_with(
+            "/project",
+            ["pytest", "-p", "docker_ci_python.ordering", "--exitfirst"]
+        )
+
+    def test_profile_tests(self):
+        self.get_packages.return_value = ["one"]
+        self.ep("profile-tests")
+        self.run.assert_called_once_with(
+            "/project", [
+                "pytest",
+                "-p",
+                "docker_ci_python.profiling",
+                "--profile-collapsed=profile.collapsed",
+                "--profile-report=profile.txt",
+            ]
+        )
+
+    def test_artifacts(self):
+        self.assertEqual([
+            "*.egg-info", ".coverage", ".coverage.doctest", ".coverage.unit",
+            ".doctest-cache.json", "build", "coverage", "coverage.xml",
+            "dist", "gen-docs", "profile.collapsed", "profile.txt",
+            "test-results.xml"
+        ], self.ep.ARTIFACTS)
+
+    def test_artifacts_are_recorded(self):
+        self.get_packages.return_value = ["one"]
+        self.artifacts.snapshot.side_effect = [{"before": 1}, {"after": 2}]
+        self.artifacts.produced.return_value = ["gen-docs"]
+        self.ep("build-docs")
+        self.assertEqual([mock.call("/project", ("gen-docs", ))] * 2,
+                         self.artifacts.snapshot.call_args_list)
+        self.artifacts.produced.assert_called_once_with({"before": 1},
+                                                        {"after": 2})
+        self.artifacts.record.assert_called_once_with(
+            "/project", ["gen-docs"]
+        )
+        self.owner.assert_any_call("/project", ["/project/.artifacts"])
+
+    def test_artifacts_are_not_recorded_without_snapshot(self):
+        self.get_packages.return_value = ["one"]
+        self.artifacts.snapshot.side_effect = OSError("permission denied")
+        self.ep("build-docs")
+        self.assertFalse(self.artifacts.record.called)
+        self.assertEqual(
+            mock.call("Could not snapshot the artifacts: permission denied",
+                      file=sys.stderr), self.print_f.call_args_list[0]
+        )
+
+    def test_artifacts_are_recorded_on_failure(self):
+        self.get_packages.return_value = ["one"]
+        self.run.side_effect = CommandException(1, ["pytest"], "FAILED")
+        self.assertRaises(CommandException, self.ep, "profile-tests")
+        self.assertTrue(self.artifacts.record.called)
+
+    def test_nothing_is_recorded_without_artifacts(self):
+        self.ep("help")
+        self.assertFalse(self.artifacts.record.called)
+
+    def test_performance_is_recorded(self):
+        self.get_packages.return_value = ["one"]
+        self.patch("time.time", mock.Mock(return_value=100.0))
+        self.ep("build-docs")
+        self.counts.assert_called_once_with("/project", ["one"])
+        args = self.record.call_args[0]
+        self.assertEqual((
+            "/project/.perf-history.sqlite", "build-docs", 100.0, True,
+            self.counts.return_value
+        ), args[:5])
+        self.assertEqual(["sphinx-apidoc", "sphinx-build"],
+                         [stage[0] for stage in args[5]])
+        self.owner.assert_any_call(
+            "/project", ["/project/.perf-history.sqlite"]
+        )
+
+    def test_bookkeeping_failure_is_only_reported(self):
+        self.get_packages.return_value = ["one"]
+        self.artifacts.record.side_effect = OSError("read-only")
+        self.record.side_effect = OSError("database is locked")
+        self.ep("build-docs")
+        self.assertEqual([
+            mock.call("Could not record the artifacts: read-only",
+                      file=sys.stderr),
+            mock.call("Could not record the performance: database is locked",
+                      file=sys.stderr),
+        ], self.print_f.call_args_list)
+
+    def test_bookkeeping_failure_keeps_command_error(self):
+        self.get_packages.return_value = ["one"]
+        self.run.side_effect = CommandException(1, ["pytest"], "FAILED")
+        self.record.side_effect = OSError("database is locked")
+        self.assertRaises(CommandException, self.ep, "profile-tests")
+
+    def test_resource_summary(self):
+        self.get_packages.return_value = ["one"]
+        self.summary.return_value = ["stage", "sphinx-build"]
+        self.ep("build-docs")
+        self.summary.assert_called_once_with(
+            self.record.call_args[0][5], self.counters.return_value
+        )
+        self.assertEqual([mock.call("stage"),
+                          mock.call("sphinx-build")],
+                         self.print_f.call_args_list[-2:])
+
+    def test_performance_is_recorded_on_failure(self):
+        self.get_packages.return_value = ["one"]
+        self.run.side_effect = CommandException(1, ["pytest"], "FAILED")
+        self.assertRaises(CommandException, self.ep, "profile-tests")
+        self.assertFalse(self.record.call_args[0][3])
+
+    def test_performance_is_not_recorded_without_stages(self):
+        self.ep("help")
+        self.assertFalse(self.record.called)
+
+    def test_perf_history(self):
+        self.patch("os.environ", {"PERF_THRESHOLD": "0.2"})
+        self.trends.return_value = [
+            ("tests", "pytest", 5, 2.0, 1.0, 1.5),
+            ("tests", "total", 1, 3.0, None, 1.5),
         ]
-        self.assertEqual([mock.call('/project', cmd)], self.run.call_args_list)
+        exit_f = self.patch("sys.exit")
+        self.ep("perf-history")
+        self.trends.assert_called_once_with(
+            "/project/.perf-history.sqlite", window=10
+        )
+        self.assertEqual(
+            mock.call(
+                "tests/pytest                                 5     2.00s"
+                "     1.00s    +100%     1.50s"
+            ), self.print_f.call_args_list[1]
+        )
+        exit_f.assert_called_once_with(
+            "Stages slower than their baseline by more than 20%: "
+            "tests/pytest"
+        )
+
+    def test_perf_history_warn_only(self):
+        self.patch("os.environ", {"PERF_WARN_ONLY": "1"})
+        self.trends.return_value = [("tests", "pytest", 5, 2.0, 1.0, 1.5)]
+        exit_f = self.patch("sys.exit")
+        self.ep("perf-history")
+        self.assertFalse(exit_f.called)
+
+    def test_perf_history_no_regressions(self):
+        self.patch("os.environ", {"PERF_THRESHOLD": "0.2"})
+        self.trends.return_value = [("tests", "pytest", 5, 1.0, 1.0, 1.5)]
+        exit_f = self.patch("sys.exit")
+        self.ep("perf-history")
+        self.assertFalse(exit_f.called)
+        self.assertEqual(2, self.print_f.call_count)
 
     def test_clean(self):
-        self.listdir.return_value = ["one.egg-info", "two.egg-info", "three"]
+        self.artifacts.exists.return_value = True
+        self.artifacts.load.return_value = ["dist", "extra"]
         self.ep.clean()
-        self.assertEqual(
-            list(
-                map(
-                    lambda path: mock.call("/project", path),
-                    self.ep.ARTIFACTS + ["one.egg-info", "two.egg-info"]
-                )
-            ),
-            self.rm.call_args_list,
+        self.assertFalse(self.artifacts.find.called)
+        self.artifacts.remove_all.assert_called_once_with(
+            ["/project/dist", "/project/extra", "/project/.artifacts"]
+        )
+
+    def test_clean_without_manifest(self):
+        self.artifacts.exists.return_value = False
+        self.artifacts.find.return_value = ["dist", "one.egg-info"]
+        self.ep.clean()
+        self.artifacts.find.assert_called_once_with(
+            "/project", self.ep.ARTIFACTS
         )
+        self.artifacts.remove_all.assert_called_once_with([
+            "/project/dist", "/project/one.egg-info", "/project/.artifacts"
+        ])
 
     def test_reformat(self):
         self.get_packages.return_value = ["one", "two"]
@@ -267,11 +540,72 @@ class EntryPointTest(BASE):  # type: ignore
         )
 
     def test_build(self):
+        self.get_packages.return_value = ["one"]
+        self.cache.get.return_value = []
+        self.wheels.side_effect = [{
+            "old.whl": 1,
+            "same.whl": 1
+        }, {
+            "old.whl": 1,
+            "same.whl": 2,
+            "new.whl": 3
+        }]
         self.ep.build()
         self.run.assert_called_once_with(
             "/project",
             ["python", "/etc/docker-python/setup.py", "bdist_wheel"],
         )
+        self.digest.assert_called_once_with(
+            "/project", [
+                "/etc/docker-python/setup.py", "/project/one",
+                "/project/setup.yml", "/project/CHANGES",
+                "/project/README.rst", "/project/MANIFEST.in"
+            ]
+        )
+        self.cache.put.assert_called_once_with(
+            self.digest.return_value,
+            ["/project/dist/same.whl", "/project/dist/new.whl"]
+        )
+        self.assertTrue(self.cache.evict.called)
+
+    def test_build_cached(self):
+        self.get_packages.return_value = ["one"]
+        self.cache.get.return_value = ["/project/.wheel-cache/abc/one.whl"]
+        self.patch("os.makedirs")
+        self.ep.build()
+        self.assertFalse(self.run.called)
+        self.shutil.copy2.assert_called_once_with(
+            "/project/.wheel-cache/abc/one.whl", "/project/dist"
+        )
+
+    def test_build_cached_then_built(self):
+        self.get_packages.return_value = ["one"]
+        self.cache.get.side_effect = [["/project/.wheel-cache/abc/one.whl"],
+                                      []]
+        self.wheels.side_effect = [{"one.whl": 1}, {"one.whl": 2}]
+        self.patch("os.makedirs")
+        calls = mock.Mock()
+        calls.attach_mock(self.owner, "owner")
+        calls.attach_mock(self.run, "run")
+        self.ep.build()
+        self.ep.build()
+        self.assertEqual([
+            mock.call.owner("/project", ["/project/dist"]),
+            mock.call.run(
+                "/project",
+                ["python", "/etc/docker-python/setup.py", "bdist_wheel"]
+            ),
+            mock.call.owner("/project", ["/project/.wheel-cache"]),
+        ], calls.mock_calls)
+
+    def test_wheel_cache(self):
+        self.cache.entries.return_value = [("abc", 42, 0, ["one.whl"])]
+        self.ep("wheel-cache")
+        self.assertEqual(mock.call("\tone.whl"), self.print_f.call_args)
+
+    def test_prune_wheel_cache(self):
+        self.ep("prune-wheel-cache")
+        self.assertTrue(self.cache.clear.called)
 
     def test_build_docs(self):
         self.get_packages.return_value = ["one", "two"]
@@ -0,0 +1,193 @@
+import os
+import sys
+import types
+import unittest
+
+from unittest import mock
+
+import pytest
+
+from docker_ci_python.ordering import OrderingPlugin, changed_modules, \
+    refers_to, source_mtimes, MTIMES, LAST_FAILED, TIME_TO_FIRST_FAILURE
+
+from .base_test import BaseTest
+
+BASE = BaseTest.with_module("docker_ci_python.ordering")
+
+
+def _item(nodeid, module=None):
+    return mock.Mock(nodeid=nodeid, module=module)
+
+
+class SourceMtimesTest(BaseTest):
+
+    def test_source_mtimes(self):
+        root = self.temp_dir()
+        for name in ["mod.py", "data.txt", os.path.join(".hidden", "x.py")]:
+            self.write_file(os.path.join(root, name))
+        self.assertEqual([os.path.realpath(os.path.join(root, "mod.py"))],
+                         list(source_mtimes(root)))
+
+
+class ChangedModulesTest(BASE):  # type: ignore
+
+    def setUp(self):
+        self.patch("os.path.realpath", lambda path: path)
+        modules = mock.patch.dict(
+            "sys.modules", {
+                "pkg.one": types.SimpleNamespace(__file__="/p/pkg/one.py"),
+                "pkg.two": types.SimpleNamespace(__file__="/p/pkg/two.py"),
+                "builtin": types.SimpleNamespace(),
+            }
+        )
+        modules.start()
+        self.addCleanup(modules.stop)
+
+    def test_changed_and_new(self):
+        self.assertEqual({"pkg.one", "pkg.two"},
+                         changed_modules({"/p/pkg/one.py": 1}, {
+                             "/p/pkg/one.py": 2,
+                             "/p/pkg/two.py": 1
+                         }))
+
+    def test_unchanged(self):
+        self.assertEqual(
+            set(), changed_modules({"/p/pkg/one.py": 1}, {"/p/pkg/one.py": 1})
+        )
+
+
+class RefersToTest(unittest.TestCase):
+
+    def test_refers_to(self):
+        module = types.ModuleType("tests.one_tests")
+        module.os = os
+        module.TestCase = unittest.TestCase
+        self.assertTrue(refers_to(_item("a", module), {"tests.one_tests"}))
+        self.assertTrue(refers_to(_item("a", module), {"os"}))
+        self.assertTrue(refers_to(_item("a", module), {"unittest.case"}))
+        self.assertFalse(refers_to(_item("a", module), {"sys"}))
+        self.assertFalse(refers_to(_item("a"), {"sys"}))
+
+
+class OrderingPluginTest(BASE):  # type: ignore
+
+    def setUp(self):
+        self.cache = {}
+        config = mock.Mock(rootdir="/project")
+        config.cache.get.side_effect = self.cache.get
+        config.cache.set.side_effect = self.cache.__setitem__
+        self.mtimes = self.patch("source_mtimes")
+        self.mtimes.return_value = {"/project/mod.py": 2}
+        self.changed = self.patch("changed_modules")
+        self.changed.return_value = {"changed"}
+        self.patch("refers_to", lambda item, modules: item.nodeid == "c")
+        self.plugin = OrderingPlugin(config)
+
+    def _order(self):
+        items = [_item(nodeid) for nodeid in ["a", "b", "c", "d"]]
+        self.plugin.pytest_collection_modifyitems(items)
+        return [item.nodeid for item in items]
+
+    def test_failed_then_changed_first(self):
+        self.cache[LAST_FAILED] = {"d": True}
+        self.cache[MTIMES] = {"/project/mod.py": 1}
+        self.assertEqual(["d", "c", "a", "b"], self._order())
+        self.assertEqual(
+            "running first: 1 previously failed, 1 related to changed "
+            "modules", self.plugin.pytest_report_collectionfinish()
+        )
+
+    def test_first_run(self):
+        self.assertEqual(["a", "b", "c", "d"], self._order())
+        self.assertFalse(self.changed.called)
+
+    def test_time_to_first_failure(self):
+        self.patch("time.time", mock.Mock(side_effect=[10.0, 12.5]))
+        self.plugin.pytest_sessionstart()
+        self.plugin.pytest_runtest_logreport(mock.Mock(failed=False))
+        self.plugin.pytest_runtest_logreport(mock.Mock(failed=True))
+        self.plugin.pytest_runtest_logreport(mock.Mock(failed=True))
+        reporter = mock.Mock()
+        self.plugin.pytest_terminal_summary(reporter)
+        reporter.write_line.assert_called_once_with(
+            "time to first failure: 2.50s"
+        )
+        self.assertEqual(2.5, self.cache[TIME_TO_FIRST_FAILURE])
+
+    def test_no_failures(self):
+        reporter = mock.Mock()
+        self.plugin.pytest_terminal_summary(reporter)
+        reporter.write_line.assert_called_once_with(
+            "time to first failure: none"
+        )
+
+    def _run_tests(self, count):
+        self._order()
+        for _ in range(count):
+            self.plugin.pytest_runtest_logfinish()
+
+    def test_sessionfinish_stores_mtimes(self):
+        self._run_tests(4)
+        self.plugin.pytest_sessionfinish(exitstatus=1)
+        self.assertEqual({"/project/mod.py": 2}, self.cache[MTIMES])
+
+    def test_exitfirst_keeps_changes(self):
+        self._run_tests(1)
+        self.plugin.pytest_sessionfinish(exitstatus=1)
+        self.assertNotIn(MTIMES, self.cache)
+
+    def test_deselection_keeps_changes(self):
+        self.plugin.pytest_deselected()
+        self._run_tests(4)
+        self.plugin.pytest_sessionfinish(exitstatus=0)
+        self.assertNotIn(MTIMES, self.cache)
+
+    def test_interruption_keeps_changes(self):
+        self._run_tests(4)
+        self.plugin.pytest_sessionfinish(exitstatus=2)
+        self.assertNotIn(MTIMES, self.cache)
+
+
+class _Recorder(object):
+    # pylint: disable=missing-docstring
+
+    def __init__(self):
+        self.order = []
+
+    def pytest_runtest_logreport(self, report):
+        if report.when == "call":
+            self.order.append(report.nodeid)
+
+
+class PytestRunTest(BaseTest):
+
+    def setUp(self):
+        self.root = self.temp_dir()
+        self.addCleanup(setattr, sys, "path", list(sys.path))
+        files = {
+            "pytest.ini": "[pytest]\n",
+            "ordering_sample.py": "VALUE = 1\n",
+            "test_a_plain.py": "def test_plain():\n    pass\n",
+            "test_b_fails.py": "def test_fails():\n    assert False\n",
+            "test_c_uses.py": "import ordering_sample\n\n\n"
+            "def test_uses():\n    assert ordering_sample.VALUE\n",
+        }
+        for name, content in files.items():
+            self.write_file(os.path.join(self.root, name), content)
+
+    def _run(self):
+        recorder = _Recorder()
+        with mock.patch.dict("sys.modules"):
+            pytest.main([self.root, "-q", "-p", "docker_ci_python.ordering"],
+                        plugins=[recorder])
+        return [nodeid.split("::")[1] for nodeid in recorder.order]
+
+    def test_failed_then_changed_first(self):
+        self.assertEqual(["test_plain", "test_fails", "test_uses"],
+                         self._run())
+        sample = os.path.join(self.root, "ordering_sample.py")
+        self.write_file(sample, "VALUE = 2\n")
+        mtime = os.path.getmtime(sample) + 10
+        os.utime(sample, (mtime, mtime))
+        self.assertEqual(["test_fails", "test_uses", "test_plain"],
+                         self._run())
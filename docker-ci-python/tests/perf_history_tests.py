@@ -0,0 +1,149 @@
+import os
+import unittest
+
+from unittest import mock
+
+from docker_ci_python.perf_history import Stage, StageTimer, \
+    project_counts, record, trends, regressions, summary_lines
+from docker_ci_python.resources import ResourceUsage
+
+from .base_test import BaseTest
+
+BASE = BaseTest.with_module("docker_ci_python.perf_history")
+
+USAGE = ResourceUsage(1024, 1.0, 2.0, 3, 4, 5, 6)
+
+
+class StageTimerTest(BASE):  # type: ignore
+
+    def test_stage(self):
+        self.patch("time.time", mock.Mock(side_effect=[1.0, 3.0, 5.0, 6.0]))
+        self.patch("_children_cpu", mock.Mock(side_effect=[1.0, 1.5, 2, 2]))
+        timer = StageTimer()
+        self.assertEqual("out", timer.run("mypy", lambda: "out"))
+        with self.assertRaises(ValueError):
+            timer.run("pylint", mock.Mock(side_effect=ValueError()))
+        self.assertEqual([("mypy", 2.0, 0.5, None),
+                          ("pylint", 1.0, 0, None)], timer.stages)
+
+    def test_usage(self):
+        self.patch("time.time", mock.Mock(side_effect=[1.0, 3.0, 5.0, 6.0]))
+        self.patch("_children_cpu", mock.Mock(return_value=0))
+        timer = StageTimer()
+        timer.run("mypy", lambda: mock.Mock(usage=USAGE))
+        error = ValueError()
+        error.usage = USAGE
+        with self.assertRaises(ValueError):
+            timer.run("pylint", mock.Mock(side_effect=error))
+        self.assertEqual([("mypy", 2.0, 3.0, USAGE),
+                          ("pylint", 1.0, 3.0, USAGE)], timer.stages)
+
+
+class DatabaseTest(BaseTest):
+
+    def setUp(self):
+        self.path = os.path.join(self.temp_dir(), "history.sqlite")
+
+    def _record(self, wall, succeeded=True):
+        record(
+            self.path, "tests", 0, succeeded, (1, 2, 3),
+            [Stage("pytest", wall, 1.0, None),
+             Stage("pytest", wall, 1.0, None)]
+        )
+
+    def _usage(self):
+        import sqlite3
+        connection = sqlite3.connect(self.path)
+        self.addCleanup(connection.close)
+        return connection.execute(
+            "SELECT name, max_rss, user_cpu, involuntary_switches "
+            "FROM stages ORDER BY name"
+        ).fetchall()
+
+    def test_no_history(self):
+        self.assertEqual([], trends(self.path, window=3))
+
+    def test_trends(self):
+        for wall in [1.0, 9.0, 2.0, 3.0, 4.0]:
+            self._record(wall)
+        self._record(100.0, succeeded=False)
+        stage_trends = {
+            trend[1]: trend
+            for trend in trends(self.path, window=3)
+        }
+        self.assertEqual(("tests", "pytest", 5, 8.0, 6.0, 2.0),
+                         stage_trends["pytest"])
+        self.assertEqual(5, stage_trends["total"][2])
+
+    def test_usage(self):
+        record(
+            self.path, "tests", 0, True, (1, 2, 3), [
+                Stage("pytest", 1.0, 3.0, USAGE),
+                Stage("pytest", 1.0, 3.0, USAGE._replace(max_rss=2048)),
+                Stage("mypy", 1.0, 1.0, None)
+            ]
+        )
+        self.assertEqual([("mypy", None, None, None),
+                          ("pytest", 2048, 2.0, 12),
+                          ("total", None, None, None)], self._usage())
+
+    def test_first_run_has_no_baseline(self):
+        self._record(1.0)
+        self.assertEqual(None, trends(self.path, window=3)[0][4])
+
+
+class RegressionsTest(unittest.TestCase):
+
+    def test_regressions(self):
+        slow = ("tests", "pytest", 5, 2.0, 1.0, 0)
+        self.assertEqual([slow],
+                         regressions([
+                             slow,
+                             ("tests", "fast", 5, 1.1, 1.0, 0),
+                             ("tests", "young", 2, 2.0, 1.0, 0),
+                             ("tests", "new", 1, 2.0, None, 0),
+                         ], threshold=0.2, min_runs=3))
+
+
+class SummaryLinesTest(unittest.TestCase):
+
+    def test_summary_lines(self):
+        lines = summary_lines([
+            Stage("pytest", 1.0, 3.0, USAGE),
+            Stage("mypy", 0.5, 0.1, None),
+            Stage("pytest", 2.0, 3.0, USAGE),
+        ], {
+            "peak_memory": 3 << 20,
+            "memory_limit": 1 << 30,
+            "oom_kills": 0,
+            "written_bytes": 2048
+        })
+        self.assertEqual(4, len(lines))
+        self.assertEqual(
+            ["pytest", "3.00s", "2.00s", "4.00s", "1.0KiB", "6", "8",
+             "10/12"], lines[1].split()
+        )
+        self.assertEqual(["mypy", "0.50s"] + ["-"] * 6, lines[2].split())
+        self.assertEqual(
+            "container: peak memory 3.0MiB of 1.0GiB, 0 OOM kills, "
+            "written 2.0KiB", lines[3]
+        )
+
+    def test_no_counters(self):
+        self.assertEqual(1, len(summary_lines([], {})))
+
+
+class ProjectCountsTest(BaseTest):
+
+    def test_project_counts(self):
+        root = self.temp_dir()
+        files = {
+            "pkg/__init__.py": "def test_like_name(): pass",
+            "pkg/mod.py": "",
+            "tests/one_tests.py": "class T:\n    def test_a(self):\n"
+            "        pass\n    def test_b(self):\n        pass\n",
+            "tests/data.txt": "def test_c(): pass",
+        }
+        for name, content in files.items():
+            self.write_file(os.path.join(root, name), content)
+        self.assertEqual((1, 3, 2), project_counts(root, ["pkg"]))
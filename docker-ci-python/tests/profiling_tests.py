@@ -0,0 +1,148 @@
+import os
+
+from unittest import mock
+
+import pytest
+
+from docker_ci_python.profiling import StackSampler, ProfilingPlugin, \
+    collapsed_lines, report_lines, SESSION
+
+from .base_test import BaseTest
+
+BASE = BaseTest.with_module("docker_ci_python.profiling")
+
+SAMPLES = {
+    "tests/a.py::test_one": {
+        ("main", "slow"): 3,
+        ("main", "fast"): 1
+    },
+    SESSION: {
+        ("main", ): 1
+    },
+}
+
+
+class StackSamplerTest(BASE):  # type: ignore
+
+    def setUp(self):
+        self.signal = self.patch("signal")
+        self.sampler = StackSampler(0.01)
+
+    def test_start_stop(self):
+        self.sampler.start()
+        self.signal.setitimer.assert_called_once_with(
+            self.signal.ITIMER_PROF, 0.01, 0.01
+        )
+        self.sampler.stop()
+        self.assertEqual(
+            mock.call(self.signal.ITIMER_PROF, 0, 0),
+            self.signal.setitimer.call_args
+        )
+
+    def test_sample_is_attributed_to_label(self):
+        self.patch("_stack", lambda frame: ("main", frame))
+        self.sampler.label = "test"
+        self.sampler._sample(None, "leaf")
+        self.sampler._sample(None, "leaf")
+        self.assertEqual({
+            "test": {
+                ("main", "leaf"): 2
+            }
+        }, self.sampler.samples)
+
+
+class FormattingTest(BASE):  # type: ignore
+
+    def test_collapsed_lines(self):
+        self.assertEqual([
+            "<session>;main 1",
+            "tests/a.py::test_one;main;fast 1",
+            "tests/a.py::test_one;main;slow 3",
+        ], collapsed_lines(SAMPLES))
+
+    def test_report_lines(self):
+        lines = report_lines(SAMPLES, 0.5)
+        self.assertEqual("Samples: 5 (2.500s of CPU time, interval 0.5s)",
+                         lines[0])
+        self.assertIn(
+            "       4  80.00%     2.000s  tests/a.py::test_one", lines
+        )
+        own = lines.index("Own time:")
+        self.assertEqual("       3  60.00%  slow", lines[own + 1])
+        cumulative = lines.index("Cumulative time:")
+        self.assertEqual("       5 100.00%  main", lines[cumulative + 1])
+
+
+class ProfilingPluginTest(BASE):  # type: ignore
+
+    def setUp(self):
+        self.sampler = self.patch("StackSampler").return_value
+        self.sampler.samples = SAMPLES
+        self.write = self.patch("_write")
+        config = mock.Mock()
+        config.getoption.side_effect = lambda name: {
+            "profile_interval": 0.5,
+            "profile_collapsed": "out.collapsed",
+            "profile_report": "out.txt",
+        }[name]
+        self.plugin = ProfilingPlugin(config)
+
+    def test_session(self):
+        self.plugin.pytest_sessionstart()
+        self.assertTrue(self.sampler.start.called)
+        self.plugin.pytest_sessionfinish()
+        self.assertTrue(self.sampler.stop.called)
+        self.assertEqual(["out.collapsed", "out.txt"],
+                         [call[0][0] for call in self.write.call_args_list])
+
+    def test_runtest_protocol_sets_label(self):
+        item = mock.Mock(nodeid="tests/a.py::test_one")
+        hook = self.plugin.pytest_runtest_protocol(item)
+        next(hook)
+        self.assertEqual("tests/a.py::test_one", self.sampler.label)
+        self.assertRaises(StopIteration, next, hook)
+        self.assertEqual(SESSION, self.sampler.label)
+
+
+BUSY_TEST = """
+def busy():
+    total = 0
+    for value in range(3000000):
+        total += value
+    return total
+
+
+def test_busy():
+    assert busy()
+"""
+
+
+class PytestRunTest(BaseTest):
+
+    def test_run(self):
+        root = self.temp_dir()
+        self.write_file(os.path.join(root, "pytest.ini"), "[pytest]\n")
+        self.write_file(os.path.join(root, "test_busy.py"), BUSY_TEST)
+        collapsed = os.path.join(root, "profile.collapsed")
+        report = os.path.join(root, "profile.txt")
+        with mock.patch.dict("sys.modules"):
+            status = pytest.main([
+                root, "-q", "-p", "no:cacheprovider", "-p",
+                "docker_ci_python.profiling", "--profile-interval=0.001",
+                "--profile-collapsed={}".format(collapsed),
+                "--profile-report={}".format(report)
+            ])
+        self.assertEqual(0, status)
+        with open(collapsed) as fil:
+            stacks = fil.read().splitlines()
+        self.assertTrue(any(
+            line.startswith("test_busy.py::test_busy;") and
+            ";busy (" in line for line in stacks
+        ))
+        with open(report) as fil:
+            lines = fil.read().splitlines()
+        self.assertTrue(lines[0].startswith("Samples: "))
+        self.assertIn("Per test:", lines)
+        self.assertTrue(any(
+            line.endswith("test_busy.py::test_busy") for line in lines
+        ))
@@ -0,0 +1,79 @@
+import os
+import types
+import unittest
+
+from docker_ci_python.resources import ResourceUsage, cgroup_counters, \
+    combine, from_rusage
+
+from .base_test import BaseTest
+
+BASE = BaseTest.with_module("docker_ci_python.resources")
+
+
+class UsageTest(unittest.TestCase):
+
+    def test_from_rusage(self):
+        rusage = types.SimpleNamespace(
+            ru_maxrss=2, ru_utime=1.5, ru_stime=0.5, ru_inblock=3,
+            ru_oublock=4, ru_nvcsw=5, ru_nivcsw=6
+        )
+        self.assertEqual(
+            ResourceUsage(2048, 1.5, 0.5, 3, 4, 5, 6), from_rusage(rusage)
+        )
+
+    def test_combine(self):
+        self.assertEqual(
+            ResourceUsage(20, 3.0, 2.0, 2, 2, 2, 2),
+            combine([
+                ResourceUsage(10, 1.0, 1.0, 1, 1, 1, 1),
+                ResourceUsage(20, 2.0, 1.0, 1, 1, 1, 1),
+            ])
+        )
+        self.assertEqual(None, combine([]))
+
+
+class CgroupCountersTest(BASE):  # type: ignore
+
+    def setUp(self):
+        self.root = self.temp_dir()
+        self.patch("CGROUP", self.root)
+
+    def _write(self, files):
+        for name, content in files.items():
+            self.write_file(os.path.join(self.root, name), content)
+
+    def test_v2(self):
+        self._write({
+            "cgroup.controllers": "cpu io memory\n",
+            "memory.peak": "1000\n",
+            "memory.max": "max\n",
+            "memory.events": "low 0\noom 1\noom_kill 1\n",
+            "io.stat": "8:0 rbytes=10 wbytes=20 rios=1\n"
+                       "8:16 rbytes=1 wbytes=2 rios=1\n",
+        })
+        self.assertEqual({
+            "peak_memory": 1000,
+            "oom_kills": 1,
+            "read_bytes": 11,
+            "written_bytes": 22,
+        }, cgroup_counters())
+
+    def test_v1(self):
+        self._write({
+            "memory/memory.max_usage_in_bytes": "1000\n",
+            "memory/memory.limit_in_bytes": "2000\n",
+            "memory/memory.oom_control": "oom_kill_disable 0\n"
+                                         "under_oom 0\noom_kill 2\n",
+            "blkio/blkio.throttle.io_service_bytes":
+            "8:0 Read 10\n8:0 Write 20\n8:0 Total 30\nTotal 30\n",
+        })
+        self.assertEqual({
+            "peak_memory": 1000,
+            "memory_limit": 2000,
+            "oom_kills": 2,
+            "read_bytes": 10,
+            "written_bytes": 20,
+        }, cgroup_counters())
+
+    def test_unavailable(self):
+        self.assertEqual({}, cgroup_counters())
@@ -1,7 +1,9 @@
+import sys
+
 from unittest import mock
 
 from docker_ci_python.run_command import run_command, _run_yieldable_command, \
-    _run_with_accumulation, CommandException
+    _run_with_accumulation, CommandException, CommandOutput
 
 from .base_test import BaseTest
 
@@ -18,14 +20,35 @@ class RunYieldableCommandTest(BASE):  # type: ignore
     def setUp(self):
         self.process = self.patch("subprocess.Popen").return_value
         self.process.stdout.readline.side_effect = [b"one", b"two", b"three"]
-        self.process.wait.return_value = 0
+        self.wait4 = self.patch("os.wait4")
+        self.wait4.return_value = (42, 0, "RUSAGE")
+        self.from_rusage = self.patch("from_rusage")
 
     def test_ok(self):
         self.assertEqual(["one", "two", "three"], list(_run()))
+        self.wait4.assert_called_once_with(self.process.pid, 0)
+        self.from_rusage.assert_called_once_with("RUSAGE")
+        self.assertEqual(0, self.process.returncode)
+
+    def test_usage_is_returned(self):
+        lines = _run()
+        self.assertEqual(["one", "two", "three"], [next(lines) for _ in "123"])
+        with self.assertRaises(StopIteration) as stop:
+            next(lines)
+        self.assertEqual(self.from_rusage.return_value, stop.exception.value)
 
     def test_nok(self):
-        self.process.wait.return_value = 1
-        self.assertRaises(CommandException, list, _run())
+        self.wait4.return_value = (42, 1 << 8, "RUSAGE")
+        with self.assertRaises(CommandException) as error:
+            list(_run())
+        self.assertEqual(1, error.exception.returncode)
+        self.assertEqual(self.from_rusage.return_value, error.exception.usage)
+
+    def test_killed(self):
+        self.wait4.return_value = (42, 9, "RUSAGE")
+        with self.assertRaises(CommandException) as error:
+            list(_run())
+        self.assertEqual(-9, error.exception.returncode)
 
 
 def _to_calls(array):
@@ -86,11 +109,25 @@ class RunCommandTest(BASE):  # type: ignore
         # pylint: disable=unused-argument
         def fake_run(accumulator, command, silent, printable, capture):
             accumulator.extend(["Line #1", "Line #2"])
+            return "USAGE"
 
         self.patch("_run_with_accumulation", fake_run)
-        self.assertEqual("Line #1Line #2", run_command(["CMD"]))
+        output = run_command(["CMD"])
+        self.assertEqual("Line #1Line #2", output)
+        self.assertIsInstance(output, CommandOutput)
+        self.assertEqual("USAGE", output.usage)
 
     def test_nok(self):
         run = self.patch("_run_with_accumulation")
-        run.side_effect = CommandException(42, ["cmd"])
-        self.assertRaises(CommandException, run_command, ["cmd"])
+        run.side_effect = CommandException(42, ["cmd"], usage="USAGE")
+        with self.assertRaises(CommandException) as error:
+            run_command(["cmd"])
+        self.assertEqual("USAGE", error.exception.usage)
+
+
+class RealCommandTest(BASE):  # type: ignore
+
+    def test_usage_of_real_process(self):
+        self.patch("UNBUFFER_PREFIX", ["env"])
+        output = run_command([sys.executable, "-c", "x = bytearray(1 << 25)"])
+        self.assertGreater(output.usage.max_rss, 1 << 25)
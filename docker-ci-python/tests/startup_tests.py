@@ -0,0 +1,56 @@
+import json
+import os
+import subprocess
+import sys
+import timeit
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules which are only needed by some of the subcommands and take too long
+# to import to be loaded on every start of the CLI
+HEAVY_MODULES = [
+    "setuptools",
+    "pkg_resources",
+    "pytest",
+    "coverage",
+    "pylint",
+    "sqlite3",
+]
+
+# Extra seconds the CLI may add on top of a bare interpreter start. Shared
+# CI runners may need more, 0 turns the check off and leaves the heavy
+# imports check as the only gate
+STARTUP_BUDGET = float(os.environ.get("STARTUP_BUDGET", "0.05"))
+
+
+def _python(code):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.check_output([sys.executable, "-c", code], env=env)
+
+
+class StartupTest(unittest.TestCase):
+
+    def test_no_heavy_imports(self):
+        loaded = json.loads(
+            _python(
+                "import sys, json\n"
+                "from docker_ci_python.main import main\n"
+                "main(['help'])\n"
+                "print(json.dumps(sorted(sys.modules)))"
+            ).decode("utf-8").splitlines()[-1]
+        )
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, loaded)
+
+    @unittest.skipUnless(STARTUP_BUDGET, "STARTUP_BUDGET is 0")
+    def test_startup_time(self):
+
+        def _best(code):
+            return min(
+                timeit.repeat(lambda: _python(code), number=1, repeat=5)
+            )
+
+        overhead = _best("from docker_ci_python.main import main\n"
+                         "main(['help'])") - _best("pass")
+        self.assertLess(overhead, STARTUP_BUDGET)
@@ -0,0 +1,97 @@
+import os
+
+from docker_ci_python.wheel_cache import WheelCache, source_digest
+
+from .base_test import BaseTest
+
+
+class SourceDigestTest(BaseTest):
+
+    def setUp(self):
+        self.root = self.temp_dir()
+        self.pkg = os.path.join(self.root, "pkg")
+        self.write_file(os.path.join(self.pkg, "__init__.py"), "")
+        self.write_file(os.path.join(self.pkg, "mod.py"), "X = 1")
+
+    def _digest(self):
+        return source_digest(
+            self.root, [self.pkg, os.path.join(self.root, "missing")]
+        )
+
+    def test_stable(self):
+        self.assertEqual(self._digest(), self._digest())
+
+    def test_ignores_bytecode(self):
+        before = self._digest()
+        self.write_file(
+            os.path.join(self.pkg, "__pycache__", "mod.pyc"), "junk"
+        )
+        self.assertEqual(before, self._digest())
+
+    def test_content_change(self):
+        before = self._digest()
+        self.write_file(os.path.join(self.pkg, "mod.py"), "X = 2")
+        self.assertNotEqual(before, self._digest())
+
+    def test_plain_files(self):
+        setup = os.path.join(self.root, "setup.yml")
+        self.write_file(setup, "name: one")
+        before = source_digest(self.root, [setup, self.pkg])
+        self.assertNotEqual(before, self._digest())
+        self.write_file(setup, "name: two")
+        self.assertNotEqual(before,
+                            source_digest(self.root, [setup, self.pkg]))
+
+    def test_rename(self):
+        before = self._digest()
+        os.rename(
+            os.path.join(self.pkg, "mod.py"),
+            os.path.join(self.pkg, "other.py")
+        )
+        self.assertNotEqual(before, self._digest())
+
+
+class WheelCacheTest(BaseTest):
+
+    def setUp(self):
+        self.root = self.temp_dir()
+        self.store = os.path.join(self.root, "store")
+        self.cache = WheelCache(self.store, 10)
+
+    def _wheel(self, name, size):
+        path = os.path.join(self.root, "dist", name)
+        self.write_file(path, "x" * size)
+        return path
+
+    def test_miss(self):
+        self.assertEqual([], self.cache.get("abc"))
+        self.assertEqual([], self.cache.entries())
+
+    def test_put_and_get(self):
+        self.cache.put("abc", [self._wheel("one.whl", 3)])
+        self.assertEqual([os.path.join(self.store, "abc", "one.whl")],
+                         self.cache.get("abc"))
+        self.assertEqual([("abc", 3, ["one.whl"])], [
+            (digest, size, names)
+            for digest, size, _, names in self.cache.entries()
+        ])
+
+    def test_incomplete_entries_are_skipped(self):
+        self.cache.put("abc", [self._wheel("one.whl", 3)])
+        os.makedirs(os.path.join(self.store, "def.tmp"))
+        self.write_file(os.path.join(self.store, "stray"))
+        self.assertEqual(["abc"],
+                         [entry[0] for entry in self.cache.entries()])
+
+    def test_evict_least_recently_used(self):
+        self.cache.put("old", [self._wheel("old.whl", 6)])
+        self.cache.put("new", [self._wheel("new.whl", 6)])
+        os.utime(os.path.join(self.store, "old"), (0, 0))
+        self.assertEqual(["old"], self.cache.evict())
+        self.assertEqual(["new"],
+                         [entry[0] for entry in self.cache.entries()])
+
+    def test_clear(self):
+        self.cache.put("abc", [self._wheel("one.whl", 3)])
+        self.cache.clear()
+        self.assertFalse(os.path.exists(self.store))
@@ -1,7 +1,17 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+
 c.NotebookApp.allow_root = True
 c.NotebookApp.ip = '0.0.0.0'
 c.NotebookApp.open_browser = False
 c.NotebookApp.password = ''
 c.NotebookApp.token = ''
+c.NotebookApp.kernel_manager_class = 'kernel_pool.PooledMappingKernelManager'
 c.KernelSpecManager.ensure_native_kernel = False
-c.KernelSpecManager.whitelist = {'kotlin'}
\ No newline at end of file
+c.KernelSpecManager.whitelist = {'kotlin'}
+c.PooledMappingKernelManager.pool_size = int(
+    os.environ.get('KERNEL_POOL_SIZE', '2'))
+c.PooledMappingKernelManager.pool_idle_timeout = float(
+    os.environ.get('KERNEL_POOL_IDLE_TIMEOUT', '600'))
\ No newline at end of file
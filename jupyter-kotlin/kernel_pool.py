@@ -0,0 +1,154 @@
+"""
+Kernel manager that keeps a few Kotlin kernels started in advance.
+
+Starting a JVM with the Kotlin compiler takes several seconds, so the pool
+hands out an already running kernel whenever a new one is requested and
+starts a replacement in the background.
+
+Pooled kernels are started in the root directory of the notebook server,
+so only the notebooks of that directory get them; notebooks in other
+directories start their kernels as usual to keep relative paths working.
+Kernels requested with extra arguments or an environment other than the
+one of the server start as usual too, since pooled kernels were started
+without them. Pooled kernels that died while idle are discarded rather than
+handed out. Restarting a kernel still starts a fresh JVM.
+"""
+
+import datetime
+import inspect
+import os
+import time
+
+from notebook.services.kernels.kernelmanager import MappingKernelManager
+from tornado import gen
+from tornado.ioloop import IOLoop, PeriodicCallback
+from traitlets import Float, Integer, Unicode
+
+SESSION_NAME = "JPY_SESSION_NAME"
+
+
+class PooledMappingKernelManager(MappingKernelManager):
+
+    pool_size = Integer(
+        2, config=True, help="Number of started kernels kept in reserve."
+    )
+
+    pool_kernel_name = Unicode(
+        "kotlin", config=True, help="Kernel spec of the pooled kernels."
+    )
+
+    pool_idle_timeout = Float(
+        600,
+        config=True,
+        help="Seconds after which a pooled kernel nobody asked for is shut "
+        "down to free its memory. The pool is filled again on the next "
+        "kernel request. 0 keeps pooled kernels forever."
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # (kernel id, working directory, time it was put into the pool)
+        self._pool = []
+        self._starting = 0
+        IOLoop.current().add_callback(self._fill_pool)
+        if self.pool_idle_timeout:
+            self._reaper = PeriodicCallback(
+                self._shutdown_idle, 1000 * min(self.pool_idle_timeout, 60)
+            )
+            self._reaper.start()
+
+    @gen.coroutine
+    def _fill_pool(self):
+        # Kernels are started one by one not to starve running notebooks
+        # of CPU with several JVMs booting at once
+        while len(self._pool) + self._starting < self.pool_size:
+            self._starting += 1
+            try:
+                kernel_id = yield super().start_kernel(
+                    path="", kernel_name=self.pool_kernel_name
+                )
+            except Exception:  # pylint: disable=broad-except
+                self.log.exception("Failed to start a pooled kernel")
+                return
+            finally:
+                self._starting -= 1
+            self._pool.append(
+                (kernel_id, self.cwd_for_path(""), time.monotonic())
+            )
+            self.log.info("Kernel %s added to the pool", kernel_id)
+
+    @gen.coroutine
+    def _shutdown_idle(self):
+        deadline = time.monotonic() - self.pool_idle_timeout
+        for entry in [it for it in self._pool if it[2] < deadline]:
+            self._pool.remove(entry)
+            self.log.info("Shutting down idle pooled kernel %s", entry[0])
+            result = self.shutdown_kernel(entry[0])
+            if result is not None:
+                yield result
+
+    @gen.coroutine
+    def _take_pooled(self, cwd):
+        # A live pooled kernel started in the directory or None
+        for entry in [it for it in self._pool if it[1] == cwd]:
+            self._pool.remove(entry)
+            kernel_id = entry[0]
+            alive = self.is_alive(kernel_id)
+            if inspect.isawaitable(alive):
+                alive = yield alive
+            if alive:
+                return kernel_id
+            self.log.warning("Pooled kernel %s died while idle", kernel_id)
+            try:
+                result = self.shutdown_kernel(kernel_id, now=True)
+                if result is not None:
+                    yield result
+            except Exception:  # pylint: disable=broad-except
+                self.log.exception("Failed to clean up kernel %s", kernel_id)
+        return None
+
+    def _poolable(self, kwargs):
+        # Whether a pooled kernel, started with the environment of the
+        # server and no extra arguments, fits the request
+        if set(kwargs) - {"env"}:
+            return False
+        env = kwargs.get("env")
+        if env is None:
+            return True
+        differs = {
+            key for key in set(env) | set(os.environ)
+            if env.get(key) != os.environ.get(key)
+        }
+        # Newer notebook servers pass the environment of the server with
+        # the session name added
+        if SESSION_NAME in differs:
+            differs.remove(SESSION_NAME)
+            self.log.debug("%s is ignored for pooled kernels", SESSION_NAME)
+        return not differs
+
+    @gen.coroutine
+    def start_kernel(
+        self, kernel_id=None, path=None, kernel_name=None, **kwargs
+    ):
+        name = kernel_name or self.default_kernel_name
+        IOLoop.current().add_callback(self._fill_pool)
+        if kernel_id is None and path is not None and \
+                name == self.pool_kernel_name and self._poolable(kwargs):
+            pooled = yield self._take_pooled(self.cwd_for_path(path))
+            if pooled is not None:
+                # Otherwise the time spent in the pool counts as idle
+                self.get_kernel(pooled).last_activity = \
+                    datetime.datetime.now(datetime.timezone.utc)
+                self.log.info("Kernel %s taken from the pool", pooled)
+                return pooled
+        kernel_id = yield super().start_kernel(
+            kernel_id=kernel_id, path=path, kernel_name=kernel_name, **kwargs
+        )
+        return kernel_id
+
+    def list_kernels(self):
+        pooled = {entry[0] for entry in self._pool}
+        return [
+            kernel for kernel in super().list_kernels()
+            if kernel["id"] not in pooled
+        ]
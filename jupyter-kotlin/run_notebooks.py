@@ -0,0 +1,238 @@
+"""
+Executes notebooks without a browser and writes the results back into them.
+
+The outputs of all the code cells of a notebook are cached together under
+a key built from the kernel name and the source of every code cell, once
+the whole notebook ran without errors. A notebook with a cached entry is
+updated without starting a kernel. Otherwise, since the state of a kernel
+can not be restored from a cache, the notebook is executed from its first
+cell.
+
+Usage::
+
+    python /run_notebooks.py [--jobs N] [--timeout SECONDS]
+                             [--cache-dir DIR] [PATH ...]
+
+PATH is either a notebook or a directory searched for notebooks
+recursively. The process exits with a non zero status if any cell fails
+or a notebook can not be executed at all, the error is printed after the
+status of the notebook.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import traceback
+from multiprocessing import Pool
+
+import nbformat
+from jupyter_client.manager import start_new_kernel
+
+CHECKPOINTS = ".ipynb_checkpoints"
+
+
+def find_notebooks(paths):
+    notebooks = []
+    for path in paths:
+        if os.path.isdir(path):
+            notebooks.extend(
+                name for name in glob.glob(
+                    os.path.join(path, "**", "*.ipynb"), recursive=True
+                ) if CHECKPOINTS not in name.split(os.sep)
+            )
+        else:
+            notebooks.append(path)
+    return sorted(set(notebooks))
+
+
+def notebook_key(cells, kernel_name):
+    """Hash of the kernel name and of the source of all code cells."""
+    digest = hashlib.sha256(kernel_name.encode("utf-8"))
+    for cell in cells:
+        if cell.cell_type == "code":
+            digest.update(b"\0" + cell.source.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class NotebookCache(object):
+
+    def __init__(self, path):
+        self._path = path
+
+    def _file(self, key):
+        return os.path.join(self._path, key[:2], key + ".json")
+
+    def get(self, key):
+        try:
+            with open(self._file(key)) as fil:
+                return json.load(fil)
+        except (IOError, ValueError):
+            return None
+
+    def put(self, key, cells):
+        """Stores the outputs and execution counts of the code cells."""
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp, "w") as fil:
+            json.dump([{
+                "outputs": cell.outputs,
+                "execution_count": cell.execution_count
+            } for cell in cells], fil)
+        os.replace(tmp, path)
+
+
+def _execute(client, cell, timeout):
+    outputs = []
+
+    def _collect(msg):
+        msg_type = msg["header"]["msg_type"]
+        if msg_type == "clear_output":
+            del outputs[:]
+        elif msg_type in (
+            "stream", "display_data", "execute_result", "error"
+        ):
+            outputs.append(nbformat.v4.output_from_msg(msg))
+
+    reply = client.execute_interactive(
+        cell.source,
+        timeout=timeout,
+        output_hook=_collect,
+        allow_stdin=False,
+        stop_on_error=True
+    )
+    content = reply["content"]
+    return outputs, content.get("execution_count"), _error(content)
+
+
+def _error(content):
+    """Text of the error of an execute reply, None if it succeeded."""
+    if content["status"] == "ok":
+        return None
+    lines = content.get("traceback") or [
+        "{}: {}".format(
+            content.get("ename", "Error"), content.get("evalue", "")
+        )
+    ]
+    return "\n".join(lines)
+
+
+def _run_cells(notebook, kernel_name, cwd, timeout):
+    manager, client = start_new_kernel(kernel_name=kernel_name, cwd=cwd)
+    try:
+        failed = None
+        error = None
+        for index, cell in enumerate(notebook.cells):
+            if cell.cell_type != "code":
+                continue
+            if failed is not None:
+                cell.outputs = []
+                cell.execution_count = None
+                continue
+            try:
+                outputs, count, error = _execute(client, cell, timeout)
+            except TimeoutError:
+                outputs, count = [], None
+                error = "Timed out after {:g} seconds".format(timeout)
+            cell.outputs = outputs
+            cell.execution_count = count
+            if error is not None:
+                failed = index
+        return failed, error
+    finally:
+        client.stop_channels()
+        manager.shutdown_kernel(now=True)
+
+
+def run_notebook(path, cache_dir, timeout):
+    """
+    :return: notebook path, number of code cells, whether the cache was
+             used, the index of the failed cell or None and the error or
+             None
+    :rtype: tuple
+    """
+    notebook = nbformat.read(path, as_version=4)
+    kernel_name = notebook.metadata.get("kernelspec", {}).get(
+        "name", "kotlin"
+    )
+    key = notebook_key(notebook.cells, kernel_name)
+    cache = NotebookCache(cache_dir)
+    code = [cell for cell in notebook.cells if cell.cell_type == "code"]
+    cached = cache.get(key)
+
+    if cached is not None:
+        for cell, entry in zip(code, cached):
+            cell.outputs = [
+                nbformat.from_dict(it) for it in entry["outputs"]
+            ]
+            cell.execution_count = entry["execution_count"]
+        failed, error = None, None
+    else:
+        failed, error = _run_cells(
+            notebook, kernel_name, os.path.dirname(os.path.abspath(path)),
+            timeout
+        )
+        if error is None:
+            cache.put(key, code)
+
+    nbformat.write(notebook, path)
+    return path, len(code), cached is not None, failed, error
+
+
+def _run(args):
+    # A broken notebook or kernel must not stop the rest from running
+    try:
+        return run_notebook(*args)
+    except Exception:  # pylint: disable=broad-except
+        return args[0], 0, False, None, traceback.format_exc()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        "Execute notebooks and store the results in them"
+    )
+    parser.add_argument("paths", nargs="*", default=["."])
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of notebooks executed at once, one kernel each"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=600,
+        help="seconds a single cell may run for"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=".notebook-cache",
+        help="directory with the outputs of previously executed notebooks"
+    )
+    args = parser.parse_args(argv)
+
+    notebooks = find_notebooks(args.paths)
+    failures = 0
+    with Pool(max(1, min(args.jobs, len(notebooks)))) as pool:
+        results = pool.imap_unordered(
+            _run, [(it, args.cache_dir, args.timeout) for it in notebooks]
+        )
+        for path, cells, from_cache, failed, error in results:
+            if error is None:
+                status = "cached" if from_cache else "executed"
+            elif failed is None:
+                status = "FAILED"
+            else:
+                status = "FAILED at cell {}".format(failed + 1)
+            print("{}: {} code cells {}".format(path, cells, status))
+            if error is not None:
+                failures += 1
+                print(error)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,19 +2,70 @@
 
 set -e
 
+now() {
+  cut -d ' ' -f 1 /proc/uptime
+}
+
+# Prints the time passed since the given uptime
+report() {
+  echo "$1 $2 $(now)" | \
+    awk '{ printf "startup: %s took %.2fs\n", $1, $3 - $2 }' >&2
+}
+
+# Reports the time passed since the previous phase finished
+phase() {
+  report $1 $PHASE_STARTED
+  PHASE_STARTED=$(now)
+}
+
+STARTED=$(now)
+PHASE_STARTED=$STARTED
+
 USER_UID=$(stat -c '%u' /project)
 USER_GID=$(stat -c '%g' /project)
 
 UR=jupyter
 HM=/home/jupyter
+M2=$HM/.m2
+OWNER=$USER_UID:$USER_GID
+
+# Stamps record the owner the files were last fixed for. The one in the
+# home directory lives as long as the container, the one in .m2 as long as
+# the mounted maven repository. Remove it to force a full check.
+HOME_STAMP=$HM/.ownership
+M2_STAMP=$M2/.ownership
 
-groupadd --gid $USER_GID $UR
-useradd -d $HM -s /bin/sh -d $HM --uid $USER_UID --gid $USER_GID $UR
+# A restarted container already has the user
+if ! getent group $UR > /dev/null; then
+  groupadd --gid $USER_GID $UR
+fi
+if ! id $UR > /dev/null 2>&1; then
+  useradd -d $HM -s /bin/sh -d $HM --uid $USER_UID --gid $USER_GID $UR
+fi
+phase user
+
+if [ "$(cat $HOME_STAMP 2> /dev/null)" != "$OWNER" ]; then
+  if [ "$(cat $M2_STAMP 2> /dev/null)" = "$OWNER" ]; then
+    SKIP_M2="-path $M2 -prune -o"
+  fi
+  mkdir -p $M2
+  # Only the entries owned by someone else are changed
+  find $HM $SKIP_M2 \( ! -user $USER_UID -o ! -group $USER_GID \) \
+    -exec chown -h $OWNER {} +
+  for STAMP in $M2_STAMP $HOME_STAMP; do
+    echo $OWNER > $STAMP
+    chown $OWNER $STAMP
+  done
+fi
+phase ownership
 
-chown -R $UR:$UR $HM
+report total $STARTED
 
 if [[ "$1" == ssh ]]; then
   /bin/sh
+elif [[ "$1" == run ]]; then
+  shift
+  su $UR -c 'python /run_notebooks.py "$@"' -- sh "$@"
 else
   su $UR -c "/usr/local/bin/jupyter-notebook --config=/config.py"
 fi
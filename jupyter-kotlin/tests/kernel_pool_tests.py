@@ -0,0 +1,149 @@
+import asyncio
+import os
+import sys
+import time
+import types
+import unittest
+
+from unittest import mock
+
+from tornado import gen
+from tornado.ioloop import IOLoop
+from traitlets.config import LoggingConfigurable
+
+ROOT = "/notebooks"
+
+
+class _MappingKernelManager(LoggingConfigurable):
+    # Just enough of notebook's MappingKernelManager, which is only
+    # installed in the image
+
+    default_kernel_name = "python3"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.kernels = {}
+        self.dead = set()
+        self.shut_down = []
+
+    @gen.coroutine
+    def start_kernel(
+        self, kernel_id=None, path=None, kernel_name=None, **kwargs
+    ):
+        kernel_id = kernel_id or "k{}".format(len(self.kernels))
+        self.kernels[kernel_id] = types.SimpleNamespace(
+            cwd=self.cwd_for_path(path or ""),
+            kernel_name=kernel_name,
+            kwargs=kwargs,
+            last_activity=None
+        )
+        return kernel_id
+
+    def cwd_for_path(self, path):
+        return os.path.normpath(os.path.join(ROOT, os.path.dirname(path)))
+
+    def is_alive(self, kernel_id):
+        return kernel_id not in self.dead
+
+    def shutdown_kernel(self, kernel_id, now=False):
+        self.shut_down.append(kernel_id)
+        del self.kernels[kernel_id]
+
+    def get_kernel(self, kernel_id):
+        return self.kernels[kernel_id]
+
+    def list_kernels(self):
+        return [{"id": kernel_id} for kernel_id in self.kernels]
+
+
+def _notebook_modules():
+    names = [
+        "notebook", "notebook.services", "notebook.services.kernels",
+        "notebook.services.kernels.kernelmanager"
+    ]
+    modules = {name: types.ModuleType(name) for name in names}
+    modules[names[-1]].MappingKernelManager = _MappingKernelManager
+    return modules
+
+
+with mock.patch.dict(sys.modules, _notebook_modules()):
+    import kernel_pool
+
+
+class PooledMappingKernelManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.addCleanup(loop.close)
+        self.addCleanup(asyncio.set_event_loop, None)
+        self.manager = kernel_pool.PooledMappingKernelManager(
+            pool_size=2, pool_idle_timeout=0
+        )
+        self._run(self.manager._fill_pool)
+        self.pooled = [entry[0] for entry in self.manager._pool]
+
+    @staticmethod
+    def _run(function, *args, **kwargs):
+        return IOLoop.current().run_sync(lambda: function(*args, **kwargs))
+
+    def _start(self, path="one.ipynb", kernel_name="kotlin", **kwargs):
+        return self._run(
+            self.manager.start_kernel, path=path, kernel_name=kernel_name,
+            **kwargs
+        )
+
+    def test_pool_is_filled(self):
+        self.assertEqual(["k0", "k1"], self.pooled)
+        self.assertEqual(
+            [(ROOT, "kotlin")] * 2,
+            [(kernel.cwd, kernel.kernel_name)
+             for kernel in self.manager.kernels.values()]
+        )
+
+    def test_pooled_kernel_is_handed_out(self):
+        self.assertEqual("k0", self._start())
+        self.assertNotIn("k0", [entry[0] for entry in self.manager._pool])
+        self.assertIsNotNone(self.manager.kernels["k0"].last_activity)
+
+    def test_session_name_is_ignored(self):
+        env = dict(os.environ, JPY_SESSION_NAME="one.ipynb")
+        self.assertEqual("k0", self._start(env=env))
+
+    def test_other_environment_starts_a_kernel(self):
+        env = dict(os.environ, EXTRA="1")
+        kernel_id = self._start(env=env)
+        self.assertNotIn(kernel_id, self.pooled)
+        self.assertEqual(
+            {"env": env}, self.manager.kernels[kernel_id].kwargs
+        )
+
+    def test_other_arguments_start_a_kernel(self):
+        self.assertNotIn(self._start(extra_arguments=["-x"]), self.pooled)
+
+    def test_other_directory_starts_a_kernel(self):
+        kernel_id = self._start(path="sub/one.ipynb")
+        self.assertNotIn(kernel_id, self.pooled)
+        self.assertEqual(
+            os.path.join(ROOT, "sub"), self.manager.kernels[kernel_id].cwd
+        )
+
+    def test_other_kernel_starts_a_kernel(self):
+        self.assertNotIn(self._start(kernel_name="python3"), self.pooled)
+
+    def test_dead_kernel_is_discarded(self):
+        self.manager.dead.add("k0")
+        self.assertEqual("k1", self._start())
+        self.assertEqual(["k0"], self.manager.shut_down)
+
+    def test_idle_kernels_are_shut_down(self):
+        self.manager.pool_idle_timeout = 600
+        kernel_id, cwd, _ = self.manager._pool[0]
+        self.manager._pool[0] = (kernel_id, cwd, time.monotonic() - 601)
+        self._run(self.manager._shutdown_idle)
+        self.assertEqual(["k0"], self.manager.shut_down)
+        self.assertEqual(["k1"], [entry[0] for entry in self.manager._pool])
+
+    def test_pooled_kernels_are_hidden(self):
+        kernel_id = self._start(kernel_name="python3")
+        self.assertEqual([{"id": kernel_id}], self.manager.list_kernels())
@@ -0,0 +1,231 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+import nbformat
+
+import run_notebooks
+from run_notebooks import NotebookCache, find_notebooks, notebook_key, \
+    run_notebook
+
+
+def _notebook(*sources):
+    notebook = nbformat.v4.new_notebook()
+    notebook.cells = [
+        nbformat.v4.new_markdown_cell(source[1:])
+        if source.startswith("#") else nbformat.v4.new_code_cell(source)
+        for source in sources
+    ]
+    return notebook
+
+
+class _TempDirTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def _path(self, *names):
+        return os.path.join(self.root, *names)
+
+
+class FindNotebooksTest(_TempDirTest):
+
+    def test_find_notebooks(self):
+        for name in ["a.ipynb", os.path.join("sub", "b.ipynb"),
+                     os.path.join("sub", ".ipynb_checkpoints", "b.ipynb"),
+                     "c.txt"]:
+            os.makedirs(os.path.dirname(self._path(name)), exist_ok=True)
+            open(self._path(name), "w").close()
+        self.assertEqual(
+            [self._path("a.ipynb"), self._path("sub", "b.ipynb")],
+            find_notebooks([self.root, self._path("a.ipynb")])
+        )
+
+
+class NotebookKeyTest(unittest.TestCase):
+
+    def test_only_code_cells(self):
+        self.assertEqual(
+            notebook_key(_notebook("#title", "x = 1").cells, "kotlin"),
+            notebook_key(_notebook("#other", "x = 1").cells, "kotlin")
+        )
+
+    def test_key_depends_on_every_code_cell(self):
+        key = notebook_key(_notebook("x = 1", "y = 2").cells, "kotlin")
+        self.assertNotEqual(
+            key, notebook_key(_notebook("x = 1", "y = 3").cells, "kotlin")
+        )
+        self.assertNotEqual(
+            key, notebook_key(_notebook("x = 1y = 2").cells, "kotlin")
+        )
+        self.assertEqual(
+            key, notebook_key(_notebook("x = 1", "y = 2").cells, "kotlin")
+        )
+
+    def test_key_depends_on_kernel(self):
+        cells = _notebook("x = 1").cells
+        self.assertNotEqual(
+            notebook_key(cells, "kotlin"), notebook_key(cells, "python3")
+        )
+
+
+class NotebookCacheTest(_TempDirTest):
+
+    def test_miss(self):
+        self.assertEqual(None, NotebookCache(self.root).get("abcd"))
+
+    def test_put_and_get(self):
+        cache = NotebookCache(self.root)
+        cells = _notebook("x = 1", "x").cells
+        cells[1].outputs = [{"output_type": "stream"}]
+        cells[1].execution_count = 3
+        cache.put("abcd", cells)
+        self.assertEqual([{
+            "outputs": [],
+            "execution_count": None
+        }, {
+            "outputs": [{
+                "output_type": "stream"
+            }],
+            "execution_count": 3
+        }], cache.get("abcd"))
+
+    def test_corrupt_entry(self):
+        os.makedirs(self._path("ab"))
+        with open(self._path("ab", "abcd.json"), "w") as fil:
+            fil.write("{")
+        self.assertEqual(None, NotebookCache(self.root).get("abcd"))
+
+
+class RunNotebookTest(_TempDirTest):
+
+    def setUp(self):
+        super(RunNotebookTest, self).setUp()
+        self.notebook = self._path("one.ipynb")
+        self.cache_dir = self._path("cache")
+        nbformat.write(_notebook("#title", "x = 1", "x"), self.notebook)
+        self.key = notebook_key(
+            nbformat.read(self.notebook, as_version=4).cells, "kotlin"
+        )
+        self.start = mock.patch.object(
+            run_notebooks, "start_new_kernel",
+            mock.Mock(side_effect=AssertionError("kernel started"))
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _run_cells(self, result):
+
+        def _run(notebook, *_):
+            for index, cell in enumerate(notebook.cells[1:]):
+                cell.outputs = []
+                cell.execution_count = index + 1
+            return result
+
+        return mock.patch.object(
+            run_notebooks, "_run_cells", side_effect=_run
+        ).start()
+
+    def test_cached(self):
+        cells = _notebook("x = 1", "x").cells
+        cells[0].execution_count = 1
+        cells[1].execution_count = 2
+        cells[1].outputs = [
+            nbformat.v4.new_output("execute_result", {"text/plain": "1"})
+        ]
+        NotebookCache(self.cache_dir).put(self.key, cells)
+        self.assertEqual((self.notebook, 2, True, None, None),
+                         run_notebook(self.notebook, self.cache_dir, 10))
+        cells = nbformat.read(self.notebook, as_version=4).cells
+        self.assertEqual([None, 1, 2],
+                         [cell.get("execution_count") for cell in cells])
+        self.assertEqual("1", cells[2].outputs[0].data["text/plain"])
+
+    def test_executed_and_cached(self):
+        run_cells = self._run_cells((None, None))
+        self.assertEqual((self.notebook, 2, False, None, None),
+                         run_notebook(self.notebook, self.cache_dir, 10))
+        self.assertEqual(self.root, run_cells.call_args[0][2])
+        self.assertEqual([
+            {"outputs": [], "execution_count": 1},
+            {"outputs": [], "execution_count": 2},
+        ], NotebookCache(self.cache_dir).get(self.key))
+
+    def test_failed_run_is_not_cached(self):
+        self._run_cells((2, "NameError"))
+        self.assertEqual((self.notebook, 2, False, 2, "NameError"),
+                         run_notebook(self.notebook, self.cache_dir, 10))
+        self.assertEqual(None, NotebookCache(self.cache_dir).get(self.key))
+
+    def test_broken_notebook_is_reported(self):
+        with open(self.notebook, "w") as fil:
+            fil.write("not a notebook")
+        path, cells, from_cache, failed, error = run_notebooks._run(
+            (self.notebook, self.cache_dir, 10)
+        )
+        self.assertEqual((self.notebook, 0, False, None),
+                         (path, cells, from_cache, failed))
+        self.assertIn("Traceback", error)
+
+
+class ErrorTest(unittest.TestCase):
+
+    def test_ok(self):
+        self.assertEqual(None, run_notebooks._error({"status": "ok"}))
+
+    def test_traceback(self):
+        self.assertEqual(
+            "line 1\nNameError: x",
+            run_notebooks._error({
+                "status": "error",
+                "ename": "NameError",
+                "evalue": "x",
+                "traceback": ["line 1", "NameError: x"]
+            })
+        )
+
+    def test_no_traceback(self):
+        self.assertEqual(
+            "NameError: x",
+            run_notebooks._error({
+                "status": "error",
+                "ename": "NameError",
+                "evalue": "x",
+                "traceback": []
+            })
+        )
+
+
+class MainTest(unittest.TestCase):
+
+    def setUp(self):
+        pool = mock.patch.object(run_notebooks, "Pool").start()
+        pool.return_value.__enter__.return_value.imap_unordered = map
+        self.addCleanup(mock.patch.stopall)
+        mock.patch.object(
+            run_notebooks, "find_notebooks", return_value=["a", "b", "c"]
+        ).start()
+        mock.patch.object(
+            run_notebooks, "run_notebook", side_effect=[
+                ("a", 2, True, None, None),
+                ("b", 3, False, 1, "NameError: x"),
+                RuntimeError("kernel died"),
+            ]
+        ).start()
+        self.print_f = mock.patch("builtins.print").start()
+
+    def test_failures_are_reported(self):
+        with self.assertRaises(SystemExit) as exit_:
+            run_notebooks.main([])
+        self.assertEqual(1, exit_.exception.code)
+        printed = [call[0][0] for call in self.print_f.call_args_list]
+        self.assertEqual([
+            "a: 2 code cells cached",
+            "b: 3 code cells FAILED at cell 2",
+            "NameError: x",
+            "c: 0 code cells FAILED",
+        ], printed[:4])
+        self.assertIn("RuntimeError: kernel died", printed[4])